@@ -1,6 +1,7 @@
-import sys, argparse, time
+import sys, argparse, time, io
 
-from torsomaxsat import WCNF
+from torsomaxsat import WCNF, read_wcnf
+from torsomaxsat import Cache, digest
 from torsomaxsat import PrimalGraph
 from torsomaxsat import State, solver_from_string
 
@@ -14,19 +15,55 @@ if __name__ == "__main__":
     parser.add_argument('--version', action='version', version='%(prog)s {0}'.format(__version__))
     parser.add_argument("-s", "--solver", help="Base solvere used. \
     Implemented solvers are [gurobi, scip, rc2, hs, fm, ortools, dp]. An external <cmd> can also be provided.", default="rc2")
-    parser.add_argument("-t", "--twsolver", help="Command to execute an external treewidth solver (PACE compatible).")
-    parser.add_argument("-f", "--file", type=argparse.FileType("r"), default=sys.stdin, help="Input formula (as DIMACS2022 wcnf). Default is stdin.")
+    parser.add_argument("-t", "--twsolver", action="append", help="Command to execute an external treewidth solver (PACE compatible). \
+    May be given multiple times for --portfolio.")
+    parser.add_argument("--twtimeout", type=float, default=60, metavar="SECONDS", help="Seconds after which the treewidth solver \
+    is stopped with SIGTERM (heuristic solvers then print their best decomposition). Default is 60.")
+    parser.add_argument("--portfolio", type=float, metavar="SECONDS", help="Compute decompositions with a portfolio of heuristics and \
+    treewidth solvers that run in parallel for the given number of seconds.")
+    parser.add_argument("--torso", choices=["clingo", "native"], default="clingo", help="How the torso is searched: with the logic \
+    program in Clingo or with a native local search (greedy and simulated annealing) that optimizes the same objective.")
+    parser.add_argument("--torso-threads", type=int, default=1, help="Number of threads used by Clingo to search the torso.")
+    parser.add_argument("--torso-steps", type=int, default=1, help="Number of steps in which Clingo searches the torso, each adding \
+    further candidates without grounding again.")
+    parser.add_argument("--torso-k", type=int, default=60, metavar="K", help="Number of candidate vertices from which the torso \
+    is chosen (by clingo in every step). Default is 60.")
+    parser.add_argument("--fanin", type=int, metavar="K", help="Split bags of the decomposition with more than K children \
+    into copies (K >= 2), such that the DP joins at most K tables at once.")
+    parser.add_argument("--max-width", type=int, default=20, metavar="W", help="Largest width of a torso that is solved by the DP \
+    (wider torsos fall back to the subsolver). Default is 20.")
+    parser.add_argument("--nd", action="store_true", help="Compute decompositions by nested dissection (the independent parts in parallel).")
+    parser.add_argument("-f", "--file", default="-", help="Input formula (as DIMACS2022 wcnf, may be compressed with xz, gzip, or bzip2). Default is stdin.")
     parser.add_argument('-p', '--primal',  action='store_true', help='Just output the primal graph of the instance.')
     parser.add_argument('-d', '--display', action='store_true', help='Just produces a visual display of the instance.')    
     parser.add_argument('-tw', action='store_true', help='Estimate the treewidth of the formula and quit.')
     parser.add_argument('-to', action='store_true', help='Computes and visualizes information about the torso of the formula and quit.')
+    parser.add_argument("--graph", choices=["primal", "incidence", "auto"], default="auto", help="Graph model used for decompositions. \
+    With auto, clauses longer than --graph-threshold become clause vertices (as in the incidence graph) instead of cliques.")
+    parser.add_argument("--graph-threshold", type=int, default=32, help="Clause length above which auto uses clause vertices.")
+    parser.add_argument("--components", action="store_true", help="Solve the connected components of the formula independently \
+    (and in parallel) with the selected solver.")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of worker processes used for --components (default is the number of cores) \
+    and, otherwise, by the dynamic program of dp (default is 1).")
+    parser.add_argument("--dp-memory", type=float, metavar="MB", help="Memory for the tables that the parallel dynamic program \
+    computes at once. Default is half of the available memory.")
+    parser.add_argument("--dp-grain", type=int, metavar="ROWS", help="Bags of the parallel dynamic program with fewer estimated rows \
+    are computed by the scheduler instead of a worker. Default is 4096.")
     parser.add_argument("--subsolver", help="Subsolver used if the main solver is dp. Same options as for -s.")
     parser.add_argument("--maxpre", help="Path to the maxpre2 preprocessor.")
+    parser.add_argument("--preprocess", action="store_true", help="Preprocess the formula with the built-in preprocessor (instead of maxpre2).")
+    parser.add_argument("--stdin", action="store_true", help="Stream the formula to an external solver over stdin instead of a temporary file.")
+    parser.add_argument("--cache", help="Directory in which parsed formulas, torsos, and decompositions are cached \
+    (keyed by a hash of the input and of the graph).")
+    parser.add_argument("--cache-size", type=float, default=1024, metavar="MB", help="Size of the cache directory above which \
+    the least recently used entries are removed. Default is 1024.")
 
     parser.add_argument("-x", "--xover", choices=["a", "b", "c", "external"], help="The xover used.", default="a")
     
     # Parse the arguments and map them to internal objects.
     args  = parser.parse_args()
+    if args.fanin is not None and args.fanin < 2:
+        parser.error("argument --fanin: K must be at least 2")
     input = args.file
     
     # Print the header (very important).
@@ -36,15 +73,21 @@ if __name__ == "__main__":
     # Read the input formula (either from stdin or a file).
     tstart = time.time()
     print(f"c Parsing the input formula ...", end = "", flush=True)    
-    phi = WCNF()
-    for line in input:
-        line = line.strip()
-        if line and not line.startswith(('c', 'p')):
-            w, c = line.split(" ")[0], [int(x) for x in line.split(" ")[1:-1]]
-            if w == "h":
-                phi.add_clause( c );
-            else:
-                phi.add_clause( c, weight = float(w) );
+    cache = None if args.cache is None else Cache(args.cache, max_size = int(args.cache_size * (1 << 20)))
+    if cache is None:
+        phi = read_wcnf(input)
+    else:
+        # Look up the formula by the hash of the input, parse and store it on a miss.
+        data  = sys.stdin.buffer.read() if input == "-" else None
+        key   = digest(input if data is None else data)
+        phi   = WCNF.load(cache.path(key, "wcnf")) if (key, "wcnf") in cache else None
+        if phi is None:
+            phi = read_wcnf(input if data is None else io.BytesIO(data))
+            phi.save(cache.path(key, "wcnf"))
+            cache.evict(keep = cache.path(key, "wcnf"))
+        else:
+            cache.touch(key, "wcnf")
+            print(" (cached)", end = "")
     print(f" {(time.time()-tstart):06.2f}s.\nc")
 
     # Print some stats.
@@ -56,23 +99,29 @@ if __name__ == "__main__":
     
     # Auxillary modes.
     if args.primal:
-        g = PrimalGraph(phi, external = True, twsolver = args.twsolver)
+        g = PrimalGraph(phi, external = True, twsolver = args.twsolver, model = args.graph, threshold = args.graph_threshold,
+                        twtimeout = args.twtimeout, cache = cache)
         print(g)
         sys.exit(0)
     if args.display:
-        g = PrimalGraph(phi, external = True, twsolver = args.twsolver)
+        g = PrimalGraph(phi, external = True, twsolver = args.twsolver, model = args.graph, threshold = args.graph_threshold,
+                        twtimeout = args.twtimeout, cache = cache)
         g.display()
         sys.exit(0)
     if args.tw:
         print("c Computing the primal graph.")
-        g = PrimalGraph(phi, external = True, twsolver = args.twsolver)
+        g = PrimalGraph(phi, external = True, twsolver = args.twsolver, model = args.graph, threshold = args.graph_threshold,
+                        twtimeout = args.twtimeout, cache = cache)
         print("c Computing a tree decomposition.")
-        (tw,_,_) = g.compute_tree_decomposition()
+        (tw,_,_) = g.compute_tree_decomposition(heuristic = "portfolio" if args.portfolio else "nd" if args.nd else "deg", budget = args.portfolio)
         print(tw)
         sys.exit(0)
     if args.to:        
-        g = PrimalGraph(phi, external = True, twsolver = args.twsolver)
-        (tw,td,root,torso) = g.compute_torso_decomposition(timeout=10)
+        g = PrimalGraph(phi, external = True, twsolver = args.twsolver, model = args.graph, threshold = args.graph_threshold,
+                        twtimeout = args.twtimeout, cache = cache)
+        (tw,td,root,torso) = g.compute_torso_decomposition(timeout=10, heuristic = "portfolio" if args.portfolio else "nd" if args.nd else "fillin", budget = args.portfolio,
+                                                           method = args.torso, threads = args.torso_threads, steps = args.torso_steps,
+                                                           k = args.torso_k)
         g.display_torso(tw,td,root,torso)        
         sys.exit(0)
 
@@ -80,7 +129,14 @@ if __name__ == "__main__":
     cmd = args.solver
     if cmd is None:
         cmd = "rc2"
-    solver = solver_from_string(args.solver, phi, preprocessor = args.maxpre, subsolver = args.subsolver)
+    preprocessor = "native" if args.preprocess else args.maxpre
+    solver = solver_from_string(args.solver, phi, preprocessor = preprocessor, twsolver = args.twsolver, subsolver = args.subsolver,
+                                stdin = args.stdin, graph = args.graph, graph_threshold = args.graph_threshold,
+                                decomposition = "portfolio" if args.portfolio else "nd" if args.nd else "fillin", budget = args.portfolio,
+                                twtimeout = args.twtimeout, fanin = args.fanin, cache = cache,
+                                components = args.components, jobs = args.jobs, torso = args.torso,
+                                torso_threads = args.torso_threads, torso_steps = args.torso_steps, torso_k = args.torso_k, max_width = args.max_width,
+                                dp_memory = args.dp_memory, dp_grain = args.dp_grain)
         
     # Solve the instance.
     tstart = time.time()
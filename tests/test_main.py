@@ -1,5 +1,7 @@
 import unittest
 import subprocess
+import tempfile
+import random
 from itertools import chain
 
 simple = [
@@ -19,10 +21,13 @@ hard = [
     ('examples/staff-scheduling_wt-instance1.wcnf.xz', 607),
 ]
 
+# Instances for the dp solver, whose results are compared against rc2.
+dp = [file for (file, _) in chain(simple, medium)] + ['examples/ware.wcnf', 'examples/simple6.wcnf']
+
 def run(file_path, solver_config=""):
         cost = float('inf')
         try:
-            result = subprocess.run("xz -dc " + file_path + " | python main.py " + solver_config, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            result = subprocess.run("python main.py -f " + file_path + " " + solver_config, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             output = result.stdout
             if result.returncode == 0:
                 for line in output.splitlines():
@@ -31,12 +36,151 @@ def run(file_path, solver_config=""):
         finally:
             return cost
 
+def run_model(file_path, solver_config=""):
+        """
+        Runs the solver and returns the reported cost together with the cost of the printed model, which is
+        recomputed from the (uncompressed) formula (None if the model violates a hard clause).
+        """
+        hard, soft = [], []
+        with open(file_path) as f:
+            for line in f:
+                tokens = line.split()
+                if not tokens or tokens[0] in ("c", "p"):
+                    continue
+                clause = [int(l) for l in tokens[1:-1]]
+                if tokens[0] == "h":
+                    hard.append(clause)
+                else:
+                    soft.append((float(tokens[0]), clause))
+        result = subprocess.run("python main.py -f " + file_path + " " + solver_config, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        cost, model = float('inf'), set()
+        for line in result.stdout.splitlines():
+            if line.startswith("o"):
+                cost = float(line.split(" ")[1])
+            elif line.startswith("v"):
+                model.update(int(l) for l in line.split()[1:])
+        satisfied = lambda clause: any(l in model for l in clause)
+        if not all(satisfied(clause) for clause in hard):
+            return (cost, None)
+        return (cost, sum(w for (w, clause) in soft if not satisfied(clause)))
+
 class TestSolver(unittest.TestCase):
+
+    def assertAgrees(self, files, solver_config):
+        # Compares the cost found with the given configuration against the one of rc2.
+        for file in files:
+            (goal, cost) = (run(file), run(file, solver_config))
+            if goal != float('inf'):
+                self.assertLessEqual(abs(cost-goal), 0.001, file)
+            else:
+                self.assertEqual(cost, goal, file)
     
     def test_rc2(self):
         for (file, goal) in chain(simple, medium):
             self.assertEqual(run(file), goal)
 
+    def test_preprocess(self):
+        for (file, goal) in chain(simple, medium):
+            self.assertEqual(run(file, "--preprocess"), goal)
+
+    def test_preprocess_model(self):
+        # Soft clauses 2 and 4 become identical and are merged, while the variables of their clause are eliminated.
+        formula = "h 4 -3 -5 0\nh -4 0\nh -2 -5 -1 0\nh -2 3 0\nh -2 0\nh 5 1 -2 0\nh -4 -2 0\nh 1 -2 5 0\nh 5 -1 0\n" \
+                  "2 -5 0\n6 5 2 0\n2 -3 4 0\n9 5 2 0\n5 5 0\n3 5 0\n3 5 0\n3 4 1 2 0\n8 4 0\n"
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.wcnf') as file:
+            file.write(formula)
+            file.flush()
+            self.assertEqual(run_model(file.name, "--preprocess"), (10, 10))
+        for file in ['examples/ware.wcnf', 'examples/ware2.wcnf', 'examples/simple3.wcnf', 'examples/simple6.wcnf']:
+            (cost, model) = run_model(file, "--preprocess")
+            self.assertLessEqual(abs(cost - model), 0.001)
+
+    def test_components(self):
+        for (file, goal) in chain(simple, medium):
+            self.assertEqual(run(file, "--components -j 2"), goal)
+
+    def test_components_empty(self):
+        # Empty soft clauses are always falsified and an empty hard clause (the last one) makes the formula unsatisfiable.
+        formula = "h 1 2 0\n3 0\n5 -1 0\nh 3 4 0\n-2 0\n"
+        for (text, status) in ((formula, "o 1"), (formula + "h 0\n", "s UNSATISFIABLE")):
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.wcnf') as file:
+                file.write(text)
+                file.flush()
+                for config in ("--components -j 2", ""):
+                    result = subprocess.run("python main.py -f " + file.name + " " + config, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    self.assertIn(status, result.stdout.splitlines())
+
+    def test_dp(self):
+        for config in ("", "--torso-k 120"):
+            self.assertAgrees(dp, "-s dpp --torso native " + config)
+
+    def test_dp_clingo(self):
+        # The torso is searched by clingo with a portfolio of two threads, adding the candidates in two steps (the
+        # search of the medium instances uses its whole time limit, so only the small ones are solved).
+        files = [file for (file, _) in simple] + ['examples/ware.wcnf', 'examples/ware2.wcnf', 'examples/simple6.wcnf']
+        self.assertAgrees(files, "-s dpp --torso-threads 2 --torso-steps 2")
+
+    def test_dp_cache(self):
+        # The second run reads the torso and its decomposition from the cache.
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(2):
+                self.assertAgrees(dp, "-s dpp --torso native --cache " + directory)
+
+    def test_dp_fanin(self):
+        # Bags with many children are split into copies, whose tables are joined pairwise.
+        self.assertAgrees(dp, "-s dpp --torso native --fanin 2")
+
+    def test_dp_decompositions(self):
+        # Other decompositions of the torso give other bags, whose clauses are compiled differently.
+        for config in ("--nd", "--portfolio 2"):
+            self.assertAgrees(dp, "-s dpp --torso native " + config)
+
+    def test_dp_incidence(self):
+        # Components of clause vertices may map to bags of the torso.
+        self.assertAgrees(dp, "-s dpp --graph incidence --torso native")
+
+    def test_dp_parallel(self):
+        # With a grain of 0, every bag is computed by a worker.
+        for config in ("-j 2", "-j 2 --dp-grain 0", "-j 2 --dp-grain 0 --fanin 2 --nd"):
+            self.assertAgrees(dp, "-s dpp --torso native " + config)
+
+    def test_nd_dense(self):
+        # The separators of a dense graph leave parts with a single vertex (and a large boundary).
+        rng = random.Random(0)
+        formula = "".join(f"h {u} {v} 0\n" for u in range(1, 256) for v in range(u+1, 256) if rng.random() < 0.3)
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.wcnf') as file:
+            file.write(formula)
+            file.flush()
+            result = subprocess.run("python main.py -tw --nd -f " + file.name, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.assertEqual(result.returncode, 0)
+            self.assertLessEqual(int(result.stdout.splitlines()[-1]), 254)
+
+    def test_twsolver(self):
+        # A fake PACE solver that reads the graph and, on SIGTERM, answers with a single bag (or a truncated output).
+        solver = "import sys, signal, time\n" \
+                 "n = [int(line.split()[2]) for line in sys.stdin if line.startswith('p')][0]\n" \
+                 "def answer(signum, frame):\n" \
+                 "    bags = 2 if sys.argv[1] == 'truncated' else 1\n" \
+                 "    print(f's td {bags} {n} {n}')\n" \
+                 "    for b in range(1, bags + 1):\n" \
+                 "        print(f'b {b} ' + ' '.join(map(str, range(1, n + 1))))\n" \
+                 "    sys.exit(0)\n" \
+                 "signal.signal(signal.SIGTERM, answer)\n" \
+                 "while True:\n" \
+                 "    time.sleep(0.1)\n"
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py') as file:
+            file.write(solver)
+            file.flush()
+            for mode in ("complete", "truncated"):
+                cmd = f"python main.py -tw -f examples/simple.wcnf.xz --twtimeout 1 -t 'python {file.name} {mode}'"
+                output = subprocess.run(cmd, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout.splitlines()
+                n = int([line for line in output if "Variables" in line][0].split()[-1])
+                if mode == "complete":
+                    self.assertEqual(int(output[-1]), n - 1)
+                else:
+                    self.assertIn("c Treewidth solver did not produce a decomposition.", output)
+                    self.assertLess(int(output[-1]), n - 1)
+
     def test_fm(self):
         for (file, goal) in simple:
             self.assertEqual(run(file, "-s fm"), goal)
@@ -1,6 +1,15 @@
 import heapq
 
-def solver_from_string(cmd, wcnf, preprocessor = None, twsolver = None, subsolver = None):
+def solver_from_string(cmd, wcnf, preprocessor = None, twsolver = None, subsolver = None, **options):
+    """
+    Creates the solver described by *cmd* for the given formula.
+    Further keyword options are passed on to the solvers that use them (and to their subsolvers).
+    With the option components, the connected components of the formula are solved by *cmd* in parallel
+    (with at most *jobs* processes, @see ComponentSolver).
+    """
+    if options.pop("components", False):
+        return ComponentSolver(wcnf, cmd, preprocessor = preprocessor, twsolver = twsolver, subsolver = subsolver,
+                               jobs = options.pop("jobs", None), options = options)
     if cmd is None or cmd == "rc2":
         solver = RC2Solver(wcnf,    preprocessor = preprocessor)        
     elif cmd == "gurobi":
@@ -16,23 +25,41 @@ def solver_from_string(cmd, wcnf, preprocessor = None, twsolver = None, subsolve
     elif cmd == "dp":
         solver = VBSolver(wcnf,     preprocessor = preprocessor, subsolver = subsolver)
         solver.twsolver = twsolver
+        solver.options  = options
     elif cmd == "dpp":
         solver = DPSolver(wcnf,     preprocessor = preprocessor, subsolver = subsolver)
         solver.twsolver = twsolver
+        solver.options  = options
     else:
-        solver = ExternalSolver(wcnf, cmd, preprocessor = preprocessor)
+        solver = ExternalSolver(wcnf, cmd, preprocessor = preprocessor, stdin = options.get("stdin", False))
     return solver
 
-def _neighbors_of_set_in(g, c, s):
+def _torso_boundaries(g, s):
     """
-    Computes the neighbors of c in set s in g.
+    Computes the connected components of g without the vertices in s together with their neighbors in s (the
+    boundary of the component in the torso s). Returns a list of pairs (component, boundary) of sets.
+    All components are found by one breadth-first search over the vertices outside of s, so that every edge is
+    considered at most twice (and g is not copied).
     """
-    neighbors = set()
-    for v in s:
-        for w in g.neighbors(v):
-            if w in c:
-                neighbors.add(v)
-    return neighbors
+    s      = s if isinstance(s, (set, frozenset)) else set(s)
+    seen   = set()
+    result = []
+    for v in g.nodes:
+        if v in s or v in seen:
+            continue
+        component, boundary, queue = {v}, set(), [v]
+        seen.add(v)
+        while queue:
+            u = queue.pop()
+            for w in g.adj[u]:
+                if w in s:
+                    boundary.add(w)
+                elif w not in seen:
+                    seen.add(w)
+                    component.add(w)
+                    queue.append(w)
+        result.append((component, boundary))
+    return result
 
 class PriorityQueue:
     """
@@ -60,7 +87,11 @@ class PriorityQueue:
         return len(self._queue)
     
 from ._utils           import BiMap
+from ._clauses         import ClauseStore
 from ._wcnf            import WCNF
+from ._parser          import read_wcnf, open_formula
+from ._cache           import Cache, digest
+from ._preprocess      import Preprocessor
 from ._torso           import Torso
 from ._primalgraph     import PrimalGraph
 from .solver           import Solver, State
@@ -73,3 +104,4 @@ from .solver._ortools  import ORSolver
 from .solver._dp       import DPSolver
 from .solver._vb       import VBSolver
 from .solver._external import ExternalSolver
+from .solver._components import ComponentSolver
@@ -0,0 +1,117 @@
+import os, shutil, hashlib, pickle, tempfile
+
+def digest(data):
+    """
+    Returns a content hash (as hex string) of the given bytes (or sequence of bytes-like objects)
+    or of the content of the file at the given path.
+    """
+    h = hashlib.blake2b(digest_size = 20)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        h.update(data)
+    elif isinstance(data, (list, tuple)):
+        for part in data:
+            h.update(part)
+    else:
+        with open(data, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 24), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for (root, _, files) in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+class Cache:
+    """
+    A directory in which results are stored under content hashes.
+
+    Every entry is addressed by a key (usually computed with @see digest) and a kind,
+    which separates different types of results stored for the same key.
+
+    If *max_size* (in bytes) is given, the least recently used entries are removed whenever
+    the directory grows beyond it (the modification time of an entry is its last use).
+    Lookups with @see get are counted in hits and misses.
+    """
+
+    def __init__(self, directory, max_size = None):
+        self.directory = directory
+        self.max_size  = max_size
+        self.hits      = 0
+        self.misses    = 0
+        os.makedirs(directory, exist_ok = True)
+
+    def path(self, key, kind):
+        """
+        Returns the path under which the entry of the given key and kind is stored.
+        """
+        return os.path.join(self.directory, f"{key}.{kind}")
+
+    def __contains__(self, entry):
+        key, kind = entry
+        return os.path.exists(self.path(key, kind))
+
+    def touch(self, key, kind):
+        """
+        Marks the entry as used (for the eviction of least recently used entries).
+        """
+        try:
+            os.utime(self.path(key, kind))
+        except OSError:
+            pass
+
+    def get(self, key, kind):
+        """
+        Returns the (pickled) object stored as entry, or None if there is no such entry or it cannot be read.
+        """
+        try:
+            with open(self.path(key, kind), "rb") as file:
+                value = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touch(key, kind)
+        return value
+
+    def put(self, key, kind, value):
+        """
+        Stores the object (pickled) as entry. The file is written to a temporary file first and then moved,
+        so that concurrent runs never read partial entries.
+        """
+        (fd, tmp) = tempfile.mkstemp(dir = self.directory, suffix = ".tmp")
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(value, file, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path(key, kind))
+        self.evict(keep = self.path(key, kind))
+
+    def evict(self, keep = None):
+        """
+        Removes the least recently used entries (except *keep*) until the directory is at most max_size bytes large.
+        """
+        if self.max_size is None:
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.path.getmtime(path), _size(path), path))
+            except OSError:
+                pass # Removed by a concurrent run.
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, path) in sorted(entries):
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        """
+        Returns a short description of the lookups so far.
+        """
+        return f"{self.hits} hits, {self.misses} misses"
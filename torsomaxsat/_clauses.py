@@ -0,0 +1,106 @@
+import numpy as np
+
+class ClauseStore:
+    __slots__ = 'literals', 'offsets', 'size', 'count'
+    """
+    A compact store for a sequence of clauses. All literals are kept in one flat typed
+    buffer, the clauses are described by an array of offsets into this buffer.
+
+    Iterating the store yields zero-copy views (numpy arrays) into the literal buffer.
+    Both buffers are allocated with spare capacity and grow geometrically, views that
+    were handed out before a reallocation stay valid (they keep the old buffer alive).
+
+    Slots:
+      literals: Flat int32 buffer with the literals of all clauses (followed by unused capacity).
+      offsets:  Flat int64 buffer, clause i is stored in literals[offsets[i]:offsets[i+1]].
+      size:     Number of literals stored in the buffer.
+      count:    Number of clauses stored in the buffer.
+    """
+
+    def __init__(self, capacity = 1024):
+        self.literals = np.empty(capacity, dtype = np.int32)
+        self.offsets  = np.zeros(capacity + 1, dtype = np.int64)
+        self.size     = 0
+        self.count    = 0
+
+    @classmethod
+    def from_buffers(cls, literals, offsets):
+        """
+        Creates a store that uses the given buffers (for instance, memory mapped arrays) without copying them.
+        The buffers are only copied once further clauses are appended.
+        """
+        store = cls(0)
+        store.literals = literals
+        store.offsets  = offsets
+        store.size     = len(literals)
+        store.count    = len(offsets) - 1
+        return store
+
+    def _reserve(self, literals, clauses = 1):
+        """
+        Ensures that the buffers have room for the given number of additional literals and clauses.
+        """
+        if self.size + literals > len(self.literals):
+            buffer = np.empty(max(2 * len(self.literals), self.size + literals), dtype = np.int32)
+            buffer[:self.size] = self.literals[:self.size]
+            self.literals = buffer
+        if self.count + clauses + 1 > len(self.offsets):
+            buffer = np.empty(max(2 * len(self.offsets), self.count + clauses + 1), dtype = np.int64)
+            buffer[:self.count + 1] = self.offsets[:self.count + 1]
+            self.offsets = buffer
+
+    def append(self, clause):
+        """
+        Appends a single clause (any sequence of integers) to the store.
+        """
+        k = len(clause)
+        self._reserve(k)
+        self.literals[self.size:self.size + k] = clause
+        self.size  += k
+        self.count += 1
+        self.offsets[self.count] = self.size
+
+    def extend(self, literals, lengths):
+        """
+        Appends many clauses at once. The clauses are given as one flat array of literals
+        together with an array containing the length of each clause.
+        """
+        k = len(literals)
+        self._reserve(k, len(lengths))
+        self.literals[self.size:self.size + k] = literals
+        self.offsets[self.count + 1:self.count + len(lengths) + 1] = self.size + np.cumsum(lengths)
+        self.size  += k
+        self.count += len(lengths)
+
+    def lits(self):
+        """
+        Returns a view on all stored literals (as one flat array).
+        """
+        return self.literals[:self.size]
+
+    def bounds(self):
+        """
+        Returns a view on the offsets of the stored clauses (count + 1 entries).
+        """
+        return self.offsets[:self.count + 1]
+
+    def lengths(self):
+        """
+        Returns an array with the length of every stored clause.
+        """
+        return np.diff(self.bounds())
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if i < 0 or i >= self.count:
+            raise IndexError("clause index out of range")
+        return self.literals[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        literals, offsets = self.literals, self.offsets
+        for i in range(self.count):
+            yield literals[offsets[i]:offsets[i+1]]
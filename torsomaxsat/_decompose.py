@@ -0,0 +1,287 @@
+import time, signal, shlex, subprocess, threading, multiprocessing, queue, itertools
+import networkx as nx
+
+import torsomaxsat as tms
+from torsomaxsat._elimination import treewidth_min_degree, treewidth_min_fill_in
+
+def dp_cost(td):
+    """
+    Estimates the cost of a dynamic program on the given decomposition as the sum of 2^|bag| over all bags.
+    """
+    return sum(2.0 ** len(bag) for bag in td.nodes)
+
+class Bag(frozenset):
+    """
+    A copy of a bag in a tree decomposition (such as the join nodes of @see root_decomposition), which behaves like
+    the frozenset of its vertices but is a distinct node: copies with different indices compare unequal to each other
+    and to the plain bag (which has index 0).
+    """
+    __slots__ = ("index",)
+
+    def __new__(cls, vertices = (), index = 0):
+        bag = super().__new__(cls, vertices)
+        bag.index = index
+        return bag
+
+    def __eq__(self, other):
+        return frozenset.__eq__(self, other) is True and (other.index if isinstance(other, Bag) else 0) == self.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return frozenset.__hash__(self) if self.index == 0 else hash((frozenset.__hash__(self), self.index))
+
+    def __reduce__(self):
+        return (Bag, (frozenset(self), self.index))
+
+def _join_order(bag, children):
+    """
+    Orders the children of a bag such that the intermediate tables of the joins stay small: the next child is the
+    one whose projection onto the bag adds the fewest new vertices (greedily, or just by size for many children).
+    """
+    if len(children) > 64:
+        return sorted(children, key = lambda c: len(c & bag))
+    order, seen, rest = [], frozenset(), list(children)
+    while rest:
+        child = min(rest, key = lambda c: (len(seen | (c & bag)), len(c & bag)))
+        rest.remove(child)
+        order.append(child)
+        seen |= child & bag
+    return order
+
+def root_decomposition(td, fanin = None):
+    """
+    Roots the tree decomposition td (a networkx graph of frozensets) for the dynamic program and returns (digraph, root),
+    where the edges point to the children and an empty artificial root is added on top.
+
+    The root minimizes the estimated cost of the dynamic program. A bag b with parent p costs 2^|b| for introducing and
+    forgetting and 2^|b| * 2^|b ∩ c| for joining the projection of every child c, so that the cost of every possible
+    root follows from moving the root along the edges (only the two ends of an edge change their parent).
+    The children of every bag are ordered by @see _join_order. With *fanin*, bags with more children are split into
+    chains of copies (@see Bag) that have at most *fanin* children each, i.e., the joins have bounded fan-in
+    (which needs fanin >= 2, as every copy is a child of the previous one).
+    """
+    if fanin is not None and fanin < 2:
+        raise ValueError(f"The fan-in of a decomposition must be at least 2 (not {fanin}).")
+    empty  = frozenset()
+    totals = {b: sum(2.0 ** len(b & c) for c in td.adj[b]) for b in td.nodes}
+    def cost(b, parent):
+        return 2.0 ** len(b) * (2 + totals[b] - 2.0 ** len(b & parent))
+
+    # Compute the cost of all roots by moving the root along a breadth-first search.
+    root  = next(iter(td.nodes))
+    edges = list(nx.bfs_edges(td, root))
+    score = {root: cost(root, empty) + sum(cost(c, p) for (p,c) in edges)}
+    for (p,c) in edges:
+        score[c] = score[p] - cost(p, empty) - cost(c, p) + cost(p, c) + cost(c, empty)
+    root = min(score, key = score.get)
+
+    # Direct the edges towards the children (in join order), splitting bags with too many children.
+    digraph = nx.DiGraph()
+    digraph.add_node(root)
+    copies  = itertools.count(1)
+    queue   = [(root, None)]
+    while queue:
+        (b, parent) = queue.pop()
+        children = _join_order(b, [c for c in td.adj[b] if c != parent])
+        queue.extend((c, b) for c in children)
+        node = b
+        while fanin is not None and len(children) > fanin:
+            # The last children are joined at the bag, the others below a copy of it (which is joined first).
+            copy = Bag(b, next(copies))
+            digraph.add_edge(node, copy)
+            digraph.add_edges_from((node, c) for c in children[-(fanin - 1):])
+            children = children[:-(fanin - 1)]
+            node     = copy
+        digraph.add_edges_from((node, c) for c in children)
+
+    # Add the empty artificial root and mark the root and the leaves.
+    digraph.add_edge(empty, root)
+    digraph.nodes[empty]['root'] = True
+    for b in digraph.nodes:
+        if digraph.out_degree(b) == 0:
+            digraph.nodes[b]['leaf'] = True
+    return (digraph, empty)
+
+def write_pace(file, n, edges, batch = 1 << 16):
+    """
+    Writes a graph with vertices 1...n and the given edges (two arrays u, v) in the format of PACE to the text file object.
+    """
+    (u, v) = edges
+    file.write(f"p tw {n} {len(u)}\n")
+    for i in range(0, len(u), batch):
+        file.write("".join(f"{a} {b}\n" for (a,b) in zip(u[i:i+batch].tolist(), v[i:i+batch].tolist())))
+
+def _parse_pace(lines):
+    """
+    Parses a tree decomposition in the format of PACE from the given lines (which are consumed as they arrive).
+    The bags are stored in a ClauseStore (one flat array of vertices), the tree edges in a list.
+    Returns (n_bags, bags, ids, edges), where ids maps the bag numbers of the solver to positions in the store.
+    """
+    n_bags, bags, ids, edges = None, tms.ClauseStore(), {}, []
+    for line in lines:
+        if line.startswith("c") or not line.strip():
+            continue
+        tokens = line.split()
+        if tokens[0] == "s":
+            n_bags = int(tokens[2])
+        elif tokens[0] == "b":
+            ids[int(tokens[1])] = len(bags)
+            bags.append([int(v) for v in tokens[2:]])
+        else:
+            edges.append((int(tokens[0]), int(tokens[1])))
+    return (n_bags, bags, ids, edges)
+
+def _pace_to_td(bags, ids, edges):
+    """
+    Builds the decomposition (width, td) as networkx graph of frozensets from a parsed PACE decomposition, or returns
+    None if the edges do not form a tree on the bags (for instance, if the output of the solver was truncated).
+    Bags that are subsets of their neighbor towards the first bag are contracted (which also removes duplicated bags).
+    """
+    tree = nx.Graph()
+    tree.add_nodes_from(ids)
+    tree.add_edges_from(edges)
+    if len(tree) != len(ids) or not nx.is_tree(tree):
+        return None
+    bag  = {b: frozenset(bags[i].tolist()) for (b,i) in ids.items()}
+    root = min(ids)
+    rep  = {root: bag[root]}
+    td   = nx.Graph()
+    td.add_node(bag[root])
+    for (parent, child) in nx.bfs_edges(tree, root):
+        if bag[child] <= rep[parent]:
+            rep[child] = rep[parent]
+        else:
+            rep[child] = bag[child]
+            td.add_edge(rep[parent], bag[child])
+    return (max((len(b) for b in td.nodes), default = 0) - 1, td)
+
+def external_decomposition(cmd, write, timeout = None, grace = 1):
+    """
+    Computes a tree decomposition with the external (PACE compatible) treewidth solver *cmd*, which is executed
+    without a shell. The graph is streamed to the solver by calling write(stdin), while its output is parsed as it arrives.
+
+    After *timeout* seconds the solver receives SIGTERM, to which solvers of the heuristic track of PACE respond by
+    printing the best decomposition found so far. If the solver is still running *grace* seconds later, it is killed.
+    Returns (width, td) or None if the solver did not produce a complete decomposition.
+    """
+    try:
+        # Call the external treewidth solver and stream the graph to it.
+        process, writer = tms._utils.popen_with_input(shlex.split(cmd), write, stderr=subprocess.DEVNULL)
+        def stop():
+            for (sig, delay) in [(signal.SIGTERM, grace), (signal.SIGKILL, None)]:
+                if process.poll() is not None:
+                    return
+                process.send_signal(sig)
+                if delay is not None:
+                    try:
+                        process.wait(delay)
+                    except subprocess.TimeoutExpired:
+                        pass
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(max(0, timeout), stop)
+            timer.daemon = True
+            timer.start()
+
+        # Parse the decomposition while the solver writes it.
+        (n_bags, bags, ids, edges) = _parse_pace(process.stdout)
+        writer.join()
+        process.wait()
+        if timer is not None:
+            timer.cancel()
+    except (OSError, ValueError, IndexError) as e:
+        print("c Error executing the treewidth solver:", e)
+        return None # If we fail, we return None.
+
+    # Only complete decompositions (all bags and the n_bags - 1 edges of the tree) are usable.
+    wtd = None
+    if n_bags is not None and len(ids) == n_bags > 0 and len(edges) == n_bags - 1:
+        wtd = _pace_to_td(bags, ids, edges)
+    if wtd is None:
+        print("c Treewidth solver did not produce a decomposition.")
+    return wtd
+
+def _heuristic_worker(name, g, heuristic, seed, deadline, results):
+    # Restart the heuristic with random tie-breaking until the deadline and report every improvement.
+    best, run = float("inf"), 0
+    while True:
+        (width, td) = heuristic(g, seed = seed + run, randomize = run > 0)
+        cost = dp_cost(td)
+        if cost < best:
+            best = cost
+            results.put((name, width, td))
+        run += 1
+        if time.time() >= deadline:
+            break
+
+def _external_worker(name, cmd, write, deadline, results):
+    wtd = external_decomposition(cmd, write, timeout = deadline - time.time())
+    if wtd is not None:
+        results.put((name, *wtd))
+
+def portfolio(g, write, twsolvers = (), budget = 10, seed = 42, prepare = None):
+    """
+    Runs a portfolio of decomposition methods in parallel processes for *budget* seconds and returns the best
+    decomposition (width, td) found, ranked by @see dp_cost. The portfolio contains the min-degree and the min-fill
+    heuristic (both restarted with random tie-breaking until the budget is used) and every external solver in
+    *twsolvers* (the graph is written to them with write(stdin)).
+
+    The graph g is a networkx graph or a PrimalGraph. Every decomposition found is passed through prepare(width, td)
+    before it is ranked (if given). If no method finishes in time, the min-degree heuristic is run sequentially.
+    """
+    tstart   = time.time()
+    deadline = tstart + budget
+    results  = multiprocessing.Queue()
+    members  = [
+        multiprocessing.Process(target=_heuristic_worker, args=("min-degree", g, treewidth_min_degree,  seed, deadline, results)),
+        multiprocessing.Process(target=_heuristic_worker, args=("min-fill",   g, treewidth_min_fill_in, seed, deadline, results)),
+    ] + [
+        multiprocessing.Process(target=_external_worker,  args=(cmd, cmd, write, deadline, results)) for cmd in twsolvers
+    ]
+
+    # Start the members and collect their results until the budget is used or all are done.
+    for process in members:
+        process.daemon = True
+        process.start()
+    best = None
+    def rank(name, width, td):
+        nonlocal best
+        (width, td) = prepare(width, td) if prepare is not None else (width, td)
+        cost        = dp_cost(td)
+        if best is None or cost < best[0]:
+            best = (cost, width, td)
+            print(f"c ├─ Portfolio: {name} found width {width} (cost {cost:.3g}) after {time.time()-tstart:.2f}s.")
+    while True:
+        try:
+            rank(*results.get(timeout = max(0.01, min(0.1, deadline - time.time()))))
+        except queue.Empty:
+            if time.time() >= deadline or not any(process.is_alive() for process in members):
+                break
+
+    # External members stop their solver at the deadline themselves (which then prints its best decomposition), give
+    # them a moment to report the result. The queue is read meanwhile, as a member only exits once its result is read.
+    grace = time.time() + 2
+    while time.time() < grace and any(process.is_alive() for process in members[2:]):
+        try:
+            rank(*results.get(timeout = 0.1))
+        except queue.Empty:
+            pass
+    for process in members[2:]:
+        process.join(max(0, grace - time.time()))
+    while True:
+        try:
+            rank(*results.get_nowait())
+        except queue.Empty:
+            break
+    for process in members:
+        process.terminate()
+        process.join()
+
+    # Fall back to a sequential heuristic if nothing was found.
+    if best is None:
+        print("c ├─ Portfolio found no decomposition within the budget.")
+        (width, td) = treewidth_min_degree(g)
+        return prepare(width, td) if prepare is not None else (width, td)
+    return (best[1], best[2])
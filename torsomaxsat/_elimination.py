@@ -0,0 +1,188 @@
+import heapq, random
+import networkx as nx
+import numpy    as np
+
+def _adjacency(g):
+    """
+    Returns the vertices of the graph (as list) and its adjacency as list of sets over the positions of the vertices.
+    The graph is either a networkx graph or a graph in CSR format (such as a PrimalGraph).
+    """
+    if hasattr(g, "indptr"):
+        labels   = g.nodes.tolist()
+        position = np.zeros(len(g.indptr), dtype = np.int64)
+        position[g.nodes] = np.arange(len(labels))
+        indptr, indices = g.indptr, position[g.indices]
+        adj = [set(indices[indptr[v]:indptr[v+1]].tolist()) for v in labels]
+    else:
+        labels   = list(g.nodes)
+        position = {v: i for (i,v) in enumerate(labels)}
+        adj = [{position[w] for w in g.adj[v] if w != v} for v in labels]
+    return (labels, adj)
+
+def _decomposition(labels, order, bags, rest):
+    """
+    Builds the tree decomposition (as networkx graph of frozensets) of an elimination order.
+    The vertex v eliminated with neighbors N gets the bag {v} ∪ N and is attached to the bag of the
+    vertex of N that is eliminated next. Vertices that were not eliminated form the root bag *rest*.
+    """
+    td   = nx.Graph()
+    pos  = {v: i for (i,v) in enumerate(order)}
+    root = frozenset(labels[v] for v in rest)
+    td.add_node(root)
+    bag  = {}
+    for v in reversed(order):
+        bag[v] = frozenset(labels[u] for u in bags[v]) | {labels[v]}
+        later  = [u for u in bags[v] if u in pos]
+        parent = bag[min(later, key = pos.get)] if later else root
+        td.add_edge(parent, bag[v])
+    return td
+
+def _min_degree(adj, rank):
+    """
+    Computes an elimination order with the min-degree heuristic using a bucket queue.
+    Initially, ties are broken by the given rank (vertices with equal degree are taken in order of their rank).
+    Returns the order, the neighbors of every vertex at its elimination, and the remaining clique.
+    """
+    n       = len(adj)
+    buckets = [[] for _ in range(n + 1)]
+    for v in sorted(range(n), key = rank.__getitem__, reverse = True):
+        buckets[len(adj[v])].append(v)
+    degree  = [len(a) for a in adj]
+    alive   = n
+    low     = 0
+    order, bags = [], {}
+    while alive > 0:
+        # Find the vertex of minimum degree (entries with outdated degrees are skipped lazily).
+        while True:
+            while not buckets[low]:
+                low += 1
+            v = buckets[low].pop()
+            if degree[v] == low:
+                break
+        if low >= alive - 1:
+            # The remaining graph is a clique.
+            break
+
+        # Eliminate v and turn its neighborhood into a clique.
+        neighbors = adj[v]
+        for u in neighbors:
+            adj[u].discard(v)
+            adj[u].update(neighbors)
+            adj[u].discard(u)
+        for u in neighbors:
+            if len(adj[u]) != degree[u]:
+                degree[u] = len(adj[u])
+                buckets[degree[u]].append(u)
+                low = min(low, degree[u])
+        order.append(v)
+        bags[v]   = neighbors
+        degree[v] = -1
+        alive    -= 1
+    rest = [v for v in range(n) if degree[v] >= 0]
+    return (order, bags, rest)
+
+def _fill(adj, v):
+    """
+    Returns the number of missing edges in the neighborhood of v.
+    """
+    neighbors = adj[v]
+    missing   = len(neighbors) * (len(neighbors) - 1)
+    for u in neighbors:
+        missing -= len(adj[u] & neighbors)
+    return missing // 2
+
+def _min_fill_in(adj, rank, exact = 32):
+    """
+    Computes an elimination order with the min-fill-in heuristic. The fill-in values are kept in a heap whose
+    outdated entries are skipped lazily. If the eliminated neighborhood has at most *exact* vertices, the fill-in
+    values are updated exactly: the neighbors are recomputed and vertices adjacent to both ends of a new edge
+    are decreased. Larger neighborhoods only mark their vertices as dirty, the fill-in of a dirty vertex is
+    recomputed (and the vertex reinserted) when it reaches the top of the heap.
+    Returns the order, the neighbors of every vertex at its elimination, and the remaining clique.
+    """
+    n     = len(adj)
+    fill  = [_fill(adj, v) for v in range(n)]
+    heap  = [(fill[v], rank[v], v) for v in range(n)]
+    heapq.heapify(heap)
+    dirty = [False] * n
+    alive = n
+    order, bags = [], {}
+    while alive > 0:
+        (f, _, v) = heapq.heappop(heap)
+        if fill[v] != f:
+            continue
+        if dirty[v]:
+            dirty[v] = False
+            fill[v]  = _fill(adj, v)
+            heapq.heappush(heap, (fill[v], rank[v], v))
+            continue
+        if f == 0 and len(adj[v]) >= alive - 1:
+            # The remaining graph is a clique (v has fill-in 0 and is adjacent to all other vertices).
+            break
+
+        # Eliminate v and turn its neighborhood into a clique.
+        neighbors = adj[v]
+        small     = len(neighbors) <= exact
+        for u in neighbors:
+            adj[u].discard(v)
+        for a in neighbors:
+            if small:
+                for b in neighbors - adj[a]:
+                    if a < b:
+                        for w in adj[a] & adj[b]:
+                            if w not in neighbors:
+                                fill[w] -= 1
+                                heapq.heappush(heap, (fill[w], rank[w], w))
+            adj[a].update(neighbors)
+            adj[a].discard(a)
+        for u in neighbors:
+            if small:
+                fill[u] = _fill(adj, u)
+                heapq.heappush(heap, (fill[u], rank[u], u))
+            else:
+                dirty[u] = True
+        order.append(v)
+        bags[v] = neighbors
+        fill[v] = -1
+        alive  -= 1
+    rest = [v for v in range(n) if fill[v] >= 0]
+    return (order, bags, rest)
+
+def _treewidth(g, heuristic, restarts, seed, randomize):
+    """
+    Runs the heuristic (restarts times with random tie-breaking after the first run, or in all runs if randomize is set)
+    and returns the best decomposition.
+    """
+    (labels, adj) = _adjacency(g)
+    if len(labels) == 0:
+        td = nx.Graph()
+        td.add_node(frozenset())
+        return (-1, td)
+    rng  = random.Random(seed)
+    best = None
+    for r in range(max(1, restarts)):
+        rank = list(range(len(labels)))
+        if r > 0 or randomize:
+            rng.shuffle(rank)
+        (order, bags, rest) = heuristic([set(a) for a in adj], rank)
+        width = max(max((len(b) for b in bags.values()), default = 0), len(rest) - 1)
+        if best is None or width < best[0]:
+            best = (width, order, bags, rest)
+    (width, order, bags, rest) = best
+    return (width, _decomposition(labels, order, bags, rest))
+
+def treewidth_min_degree(g, restarts = 1, seed = 42, randomize = False):
+    """
+    Returns a tree decomposition (width, td) of g computed with the min-degree heuristic, in the same shape as
+    networkx.algorithms.approximation.treewidth_min_degree. The graph is a networkx graph or a PrimalGraph.
+    With restarts > 1, further runs with random tie-breaking are performed and the narrowest decomposition is returned.
+    With randomize, ties are broken randomly in the first run as well.
+    """
+    return _treewidth(g, _min_degree, restarts, seed, randomize)
+
+def treewidth_min_fill_in(g, restarts = 1, seed = 42, randomize = False):
+    """
+    Returns a tree decomposition (width, td) of g computed with the min-fill-in heuristic, in the same shape as
+    networkx.algorithms.approximation.treewidth_min_fill_in (@see treewidth_min_degree).
+    """
+    return _treewidth(g, _min_fill_in, restarts, seed, randomize)
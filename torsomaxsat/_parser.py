@@ -0,0 +1,100 @@
+import sys, os, io, re
+import lzma, gzip, bz2
+import numpy as np
+
+from torsomaxsat import WCNF
+
+# Magic bytes of the supported compression formats.
+_compressions = [
+    (b"\xfd7zXZ\x00", lzma.open),
+    (b"\x1f\x8b",     gzip.open),
+    (b"BZh",          bz2.open),
+]
+
+# Lines that carry no clause: comments, the (optional) header, and soft clauses of weight 0.
+_comments = re.compile(rb"^[ \t]*(?:[cp]|(?:0+\.?0*|\.0+)[ \t])[^\n]*", re.M)
+
+# The weight of hard clauses, which is replaced by inf to tokenize everything as numbers.
+_hard = re.compile(rb"^[ \t]*h(?=[ \t])", re.M)
+
+def _normalize(text):
+    """
+    Removes lines without clauses from the chunk and replaces the weight of hard clauses by inf.
+    The regular expressions are only used if a quick scan of the chunk shows that they are needed.
+    """
+    text     = b"\n" + text
+    indented = b"\n " in text or b"\n\t" in text
+    if indented or b"c" in text or b"p" in text or b"\n0" in text or b"\n." in text:
+        text = _comments.sub(b"", text)
+    text = text.replace(b"\nh ", b"\ninf ")
+    if b"h" in text:
+        text = _hard.sub(b"inf", text)
+    return text
+
+def open_formula(source):
+    """
+    Returns a binary stream with the (decompressed) content of the given source.
+
+    The source may be "-" for stdin or a file object (binary or text). Inputs compressed
+    with xz, gzip, or bzip2 are recognized by their magic bytes and are decompressed on the fly.
+    The caller remains responsible for closing the source.
+    """
+    if source == "-":
+        stream = sys.stdin.buffer
+    elif isinstance(source, io.TextIOBase) and not hasattr(source, "buffer"):
+        stream = io.BytesIO(source.read().encode())
+    else:
+        stream = getattr(source, "buffer", source)
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    header = stream.peek(6)[:6]
+    for (magic, opener) in _compressions:
+        if header.startswith(magic):
+            return opener(stream, "rb")
+    return stream
+
+def read_wcnf(source, wcnf = None, chunk_size = 1 << 24):
+    """
+    Reads a formula in the DIMACS format used since 2022 and returns it as WCNF.
+
+    The input is read in chunks of *chunk_size* bytes, each chunk is tokenized as a
+    whole and its clauses are added in bulk with @see WCNF.add_clauses. The source is a
+    path, "-" for stdin, or a file object (see @see open_formula). If a *wcnf* is given,
+    the clauses are added to it.
+    """
+    if isinstance(source, (str, os.PathLike)) and source != "-":
+        with open(source, "rb") as file:
+            return read_wcnf(file, wcnf, chunk_size)
+    wcnf   = WCNF() if wcnf is None else wcnf
+    stream = open_formula(source)
+    rest   = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        cut   = chunk.rfind(b"\n") + 1
+        rest  = chunk[cut:]
+        _parse_chunk(chunk[:cut], wcnf)
+    _parse_chunk(rest, wcnf)
+    return wcnf
+
+def _parse_chunk(text, wcnf):
+    """
+    Parses a chunk of complete lines and adds the contained clauses to the formula.
+    """
+    tokens = np.array(_normalize(text).split(), dtype = np.float64)
+    if len(tokens) == 0:
+        return
+
+    # Every clause is terminated by a 0 and the token after it is the weight of the next clause.
+    ends = np.flatnonzero(tokens == 0)
+    if len(ends) == 0 or ends[-1] != len(tokens) - 1:
+        raise ValueError("clause is not terminated by 0")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # Split the tokens into weights and literals.
+    literals = np.ones(len(tokens), dtype = bool)
+    literals[starts] = False
+    literals[ends]   = False
+    wcnf.add_clauses(tokens[literals].astype(np.int64), ends - starts - 1, tokens[starts])
@@ -0,0 +1,284 @@
+import time
+import numpy as np
+
+from torsomaxsat import WCNF
+
+class Preprocessor:
+    """
+    An in-process MaxSAT preprocessor working on the internal representation of a WCNF.
+
+    The preprocessor applies unit propagation, removal of duplicate and subsumed clauses,
+    pure literal elimination, bounded variable elimination (only on variables that are not soft),
+    and merging of identical soft clauses. The result is a new (usually smaller) WCNF whose
+    variables are named by the internal variables of the input. A model of the result can be
+    extended to a model of the input with @see reconstruct.
+
+    Every technique records how many clauses and variables it removed and how long it took (in stats).
+    """
+
+    def __init__(self, wcnf, techniques = ("units", "duplicates", "subsumption", "pure", "bve", "soft"),
+                 rounds = 3, max_resolvents = 64, max_resolvent_length = 16):
+        self.wcnf       = wcnf
+        self.techniques = techniques
+        self.rounds     = rounds
+        self.max_resolvents       = max_resolvents
+        self.max_resolvent_length = max_resolvent_length
+
+        self.clauses = []   # The working clauses as sets of literals (None if removed).
+        self.occ     = {}   # A map from literals to the ids of the clauses containing them.
+        self.units   = []   # Unit clauses that still have to be propagated.
+        self.value   = {}   # Variables with a fixed value.
+        self.stack   = []   # Reconstruction stack of ("fix", v, value), ("elim", x, clauses), and ("copy", v, u) entries.
+        self.soft    = dict(wcnf.soft)
+        self.gain    = 0    # Weight of soft variables that were fixed to true.
+        self.unsat   = False
+        self.stats   = {}
+
+    def preprocess(self):
+        """
+        Runs the preprocessor and returns the preprocessed formula (or None if the formula is unsatisfiable).
+        """
+        self._load()
+        for _ in range(self.rounds):
+            size = self._size()
+            for technique in self.techniques:
+                if self.unsat:
+                    break
+                self._time(technique, getattr(self, "_" + technique))
+            if self.unsat or size == self._size():
+                break
+        self._log()
+        return None if self.unsat else self._result()
+
+    def reconstruct(self, assignment):
+        """
+        Extends a model of the preprocessed formula (as 0/1 array) to a model of the input formula (as 0/1 array).
+        """
+        model = np.zeros(self.wcnf.n, dtype = np.int64)
+        if len(assignment) > 0:
+            names = self.result.varmap.keys(np.arange(1, self.result.n + 1))
+            model[names - 1] = np.asarray(assignment[:self.result.n]) > 0
+
+        # Undo fixed and eliminated variables in reverse order.
+        def satisfied(c):
+            return any(model[abs(l)-1] == (l > 0) for l in c)
+        for (kind, v, data) in reversed(self.stack):
+            if kind == "fix":
+                model[v-1] = data
+            elif kind == "copy":
+                model[v-1] = model[data-1]   # v was merged into u (whose value is already reconstructed)
+            else:
+                model[v-1] = 0
+                if any(v in c and not satisfied(c) for c in data):
+                    model[v-1] = 1
+
+        # Soft variables (of the input) are set to true whenever their soft clause allows it.
+        for v in self.wcnf.soft:
+            if self.wcnf.origin.get(v, (0, 0))[1] == 0:
+                continue
+            c = self.wcnf._soft_clause(v)
+            model[v-1] = not satisfied(c) if v in self.wcnf.negative else satisfied(c)
+        return model.tolist()
+
+    #
+    # Bookkeeping
+    #
+
+    def _size(self):
+        """
+        Returns the number of remaining clauses and the number of removed variables.
+        """
+        clauses   = sum(1 for c in self.clauses if c is not None)
+        variables = len(self.value) + sum(1 for e in self.stack if e[0] == "elim")
+        return (clauses, variables)
+
+    def _time(self, technique, method):
+        (clauses, variables) = self._size()
+        tstart = time.time()
+        method()
+        (c, v, t) = self.stats.get(technique, (0, 0, 0))
+        (remaining, removed) = self._size()
+        self.stats[technique] = (c + clauses - remaining, v + removed - variables, t + time.time() - tstart)
+
+    def _log(self):
+        print("c Native preprocessing:")
+        for (technique, (c, v, t)) in self.stats.items():
+            print(f"c ├─ {technique + ':':<13} {c:8} clauses, {v:8} variables removed in {t:06.2f}s")
+        if self.unsat:
+            print("c ├─ The formula is unsatisfiable.")
+        print( "c └─────────────────────────────────────", flush = True)
+
+    def _load(self):
+        for c in self.wcnf.hard:
+            self._add(set(c.tolist()))
+
+    def _add(self, c):
+        """
+        Adds a clause to the working set (tautologies are dropped).
+        """
+        if any(-l in c for l in c):
+            return
+        if len(c) == 0:
+            self.unsat = True
+            return
+        i = len(self.clauses)
+        self.clauses.append(c)
+        for l in c:
+            self.occ.setdefault(l, set()).add(i)
+        if len(c) == 1:
+            self.units.append(i)
+
+    def _remove(self, i):
+        for l in self.clauses[i]:
+            self.occ[l].discard(i)
+        self.clauses[i] = None
+
+    def _fix(self, l):
+        """
+        Fixes the literal l to true, removes satisfied clauses and shortens the others.
+        """
+        v = abs(l)
+        self.value[v] = l > 0
+        self.stack.append(("fix", v, l > 0))
+        if v in self.soft:
+            if l > 0:
+                self.gain += self.soft[v]
+            del self.soft[v]
+        for i in list(self.occ.get(l, ())):
+            self._remove(i)
+        for i in list(self.occ.get(-l, ())):
+            c = self.clauses[i]
+            c.discard(-l)
+            self.occ[-l].discard(i)
+            if len(c) == 0:
+                self.unsat = True
+            elif len(c) == 1:
+                self.units.append(i)
+
+    def _occurrences(self, l):
+        return len(self.occ.get(l, ()))
+
+    #
+    # Techniques
+    #
+
+    def _units(self):
+        while self.units and not self.unsat:
+            c = self.clauses[self.units.pop()]
+            if c is None or len(c) != 1:
+                continue
+            self._fix(next(iter(c)))
+
+    def _duplicates(self):
+        seen = set()
+        for (i,c) in enumerate(self.clauses):
+            if c is None:
+                continue
+            key = frozenset(c)
+            if key in seen:
+                self._remove(i)
+            else:
+                seen.add(key)
+
+    def _subsumption(self):
+        order = sorted((i for (i,c) in enumerate(self.clauses) if c is not None), key = lambda i: len(self.clauses[i]))
+        for i in order:
+            c = self.clauses[i]
+            if c is None:
+                continue
+            l = min(c, key = self._occurrences)
+            for j in list(self.occ[l]):
+                d = self.clauses[j]
+                if j != i and len(d) >= len(c) and c <= d:
+                    self._remove(j)
+
+    def _pure(self):
+        changed = True
+        while changed and not self.unsat:
+            changed = False
+            for v in {abs(l) for l in self.occ}:
+                if v in self.value:
+                    continue
+                positive, negative = self._occurrences(v), self._occurrences(-v)
+                if v in self.soft:
+                    # Soft variables may only be set to true (or are free if they occur nowhere).
+                    if negative == 0:
+                        self._fix(v)
+                        changed = True
+                elif positive == 0 and negative > 0:
+                    self._fix(-v)
+                    changed = True
+                elif negative == 0 and positive > 0:
+                    self._fix(v)
+                    changed = True
+        self._units()
+
+    def _bve(self):
+        variables = {abs(l) for (l,o) in self.occ.items() if o}
+        variables = sorted((v for v in variables if v not in self.soft and v not in self.value),
+                           key = lambda v: self._occurrences(v) + self._occurrences(-v))
+        for x in variables:
+            if self.unsat:
+                break
+            pos, neg = list(self.occ.get(x, ())), list(self.occ.get(-x, ()))
+            if len(pos) == 0 or len(neg) == 0 or len(pos) * len(neg) > self.max_resolvents:
+                continue
+
+            # Compute all non-tautological resolvents and check the bound.
+            resolvents = set()
+            for i in pos:
+                for j in neg:
+                    r = (self.clauses[i] - {x}) | (self.clauses[j] - {-x})
+                    if any(-l in r for l in r):
+                        continue
+                    resolvents.add(frozenset(r))
+                    if len(r) > self.max_resolvent_length or len(resolvents) > len(pos) + len(neg):
+                        break
+                else:
+                    continue
+                break
+            else:
+                # Eliminate x: store its clauses for the reconstruction and replace them by the resolvents.
+                self.stack.append(("elim", x, [list(self.clauses[i]) for i in pos + neg]))
+                for i in pos + neg:
+                    self._remove(i)
+                for r in resolvents:
+                    self._add(set(r))
+                self._units()
+
+    def _soft(self):
+        # Soft variables that only occur negatively are characterized by the remainders of their clauses.
+        groups = {}
+        for v in list(self.soft):
+            if self._occurrences(v) > 0 or self._occurrences(-v) == 0:
+                continue
+            key = frozenset(frozenset(self.clauses[i] - {-v}) for i in self.occ[-v])
+            groups.setdefault(key, []).append(v)
+
+        # Identical soft clauses are merged into the first one (and take its value in the reconstruction).
+        for group in groups.values():
+            for v in group[1:]:
+                self.soft[group[0]] += self.soft[v]
+                del self.soft[v]
+                for i in list(self.occ[-v]):
+                    self._remove(i)
+                self.value[v] = False
+                self.stack.append(("copy", v, group[0]))
+
+    #
+    # Result
+    #
+
+    def _result(self):
+        """
+        Builds the preprocessed formula from the working clauses.
+        """
+        result   = WCNF()
+        clauses  = [sorted(c) for c in self.clauses if c is not None]
+        literals = np.fromiter((l for c in clauses for l in c), dtype = np.int64)
+        lengths  = np.fromiter((len(c) for c in clauses),       dtype = np.int64, count = len(clauses))
+        result.add_clauses(literals, lengths, np.full(len(clauses), float("inf")))
+        for (v,w) in self.soft.items():
+            result._add_soft(v, w)
+        self.result = result
+        return result
@@ -1,19 +1,31 @@
 import itertools
+import numpy             as np
 import networkx          as nx
 import matplotlib.pyplot as plt
-import tempfile, subprocess, os
+import io, multiprocessing
 
 import torsomaxsat as tms
 from torsomaxsat import Torso
+from torsomaxsat._cache import digest
+from torsomaxsat._elimination import treewidth_min_degree, treewidth_min_fill_in
+from torsomaxsat._decompose   import Bag, external_decomposition, portfolio, root_decomposition, write_pace
 
 def _separation(g):
     """
     Returns a separation (A,S,B) such that S is a separator
     between A and B. A soft constraint is that A and B have similar size while S is small.
     """    
-    # First, compute a partition into two sets.
-    part = nx.community.kernighan_lin_bisection(g, seed = 42)
-    A, B = g.subgraph(part[0]), g.subgraph(part[1])
+    # First, compute a partition into two sets: the vertices close to a pseudo-peripheral vertex (by breadth-first
+    # search) and the others, which is refined by Kernighan-Lin.
+    start = next(iter(g.nodes))
+    for _ in range(2):
+        order = list(nx.single_source_shortest_path_length(g, start))
+        start = order[-1]
+    seen   = set(order)
+    order += [v for v in g.nodes if v not in seen]
+    half  = len(order) // 2
+    part  = nx.community.kernighan_lin_bisection(g, (set(order[:half]), set(order[half:])), seed = 42)
+    A, B = part
 
     # Then, compute the bipartite graph between these two sets.
     h = nx.Graph()
@@ -30,46 +42,334 @@ def _separation(g):
     vertex_cover = nx.bipartite.to_vertex_cover( h, matching, top_nodes = A)
 
     # Return the separation
-    return (A.nodes - vertex_cover, vertex_cover, B.nodes - vertex_cover)
+    return (A - vertex_cover, vertex_cover, B - vertex_cover)
+
+def _leaf(g, U, W, parent, edges):
+    """
+    Decomposes the vertices U of g, whose neighbors outside of U are W, with the min-fill-in heuristic and
+    attaches the result to the bag *parent* (which contains W). To this end, W is turned into a clique such that
+    some bag contains it. Bags that are subsets of their parent are contracted.
+    """
+    h = g.subgraph(U | W).copy()
+    h.add_edges_from(itertools.combinations(W, 2))
+    (_, td) = treewidth_min_fill_in(h)
+    top = max((bag for bag in td.nodes if W <= bag), key = len)
+    rep = {}
+    for (a, b) in itertools.chain([(None, top)], nx.bfs_edges(td, top)):
+        outer = rep[a] if a is not None else parent
+        if outer is not None and b <= outer:
+            rep[b] = outer
+        else:
+            rep[b] = b
+            edges.append((outer, b))
+
+def _dissect(g, U, W, leaf, depth = None, parent = None):
+    """
+    Decomposes the vertices U of g by nested dissection, where W are the vertices of ancestor bags adjacent to U.
+    The separator S of g[U] (@see _separation) together with W forms the root bag, and every connected component
+    of g[U - S] is decomposed recursively with the vertices of the root bag adjacent to it. Parts with at most
+    *leaf* vertices (together with W) or a single vertex in U are decomposed by the min-fill-in heuristic (@see _leaf).
+
+    Returns the edges of the decomposition as pairs (parent, bag), where the root is attached to *parent*, and the
+    parts that were not decomposed because they are *depth* levels below the root (as tuples (U, W, parent)).
+    """
+    edges, pending = [], []
+    stack = [(frozenset(U), frozenset(W), parent, 0)]
+    while stack:
+        (U, W, parent, level) = stack.pop()
+        if depth is not None and level >= depth:
+            pending.append((U, W, parent))
+            continue
+        if len(U) + len(W) <= leaf or len(U) < 2:
+            _leaf(g, U, W, parent, edges)
+            continue
+        (A, S, B) = _separation(g.subgraph(U).copy())
+        if not S:
+            _leaf(g, U, W, parent, edges)
+            continue
+        bag = frozenset(S) | W
+        edges.append((parent, bag))
+        for P in (c for P in (A, B) if P for c in nx.connected_components(g.subgraph(P))):
+            boundary = frozenset(w for v in P for w in g.adj[v] if w in bag)
+            stack.append((frozenset(P), boundary, bag, level + 1))
+    return (edges, pending)
+
+def _dissect_task(g, U, W, parent, leaf):
+    # g is the subgraph induced by U and W, which is all that @see _dissect looks at.
+    return _dissect(g, U, W, leaf, parent = parent)[0]
+
+def nested_dissection(g, leaf = 64, processes = None, depth = 2):
+    """
+    Computes a tree decomposition (width, td) of the networkx graph g by nested dissection (@see _dissect).
+    The parts below the first *depth* levels are independent and are decomposed in parallel by a pool of
+    *processes* worker processes (all cores by default, no pool is used with processes = 1). Every worker gets
+    the subgraph of its part.
+    """
+    if multiprocessing.current_process().daemon:
+        processes = 1 # Daemonic processes (such as portfolio members) cannot have children.
+    td      = nx.Graph()
+    roots   = []
+    edges   = []
+    pending = []
+    for component in nx.connected_components(g):
+        (subedges, subpending) = _dissect(g, component, (), leaf, None if processes == 1 else depth)
+        edges.extend(subedges)
+        pending.extend(subpending)
+
+    # The pending parts of all components are decomposed by one pool.
+    if pending:
+        with multiprocessing.Pool(processes) as pool:
+            subtrees = pool.starmap(_dissect_task, [(g.subgraph(U | W).copy(), U, W, parent, leaf) for (U, W, parent) in pending])
+        for subedges in subtrees:
+            edges.extend(subedges)
+    for (parent, bag) in edges:
+        if parent is None:
+            roots.append(bag)
+            td.add_node(bag)
+        else:
+            td.add_edge(parent, bag)
+
+    # The components share no vertices, so their decompositions can be connected arbitrarily.
+    td.add_edges_from(zip(roots, roots[1:]))
+    if len(td) == 0:
+        td.add_node(frozenset())
+    return (max(len(bag) for bag in td.nodes) - 1, td)
+
+def _sorted_unique(a):
+    """
+    Returns the sorted distinct values of the array a (sort based, which is faster than np.unique on large integer arrays).
+    """
+    a = np.sort(a)
+    return a[np.concatenate(([True], a[1:] != a[:-1]))] if len(a) > 0 else a
 
 class PrimalGraph:
+    """
+    The primal graph of a formula: the variables are the vertices and every hard clause induces a clique.
 
-    def __init__(self, wcnf, external = False, twsolver = None):
-        self.wcnf     = wcnf
-        self.n        = wcnf.n
-        self.twsolver = twsolver
-        
-        # build the graph
-        self.g    = nx.Graph()
-
-        # add a clique for every clause
-        for c in self.wcnf.hard:
-            if external:
-                c = self.wcnf._to_external(c)
-            for (l1,l2) in itertools.combinations(c, 2):
-                self.g.add_edge(abs(l1), abs(l2))
-                
-    def compute_tree_decomposition(self, heuristic = "deg"):
+    The graph is stored in compressed sparse row (CSR) format: the neighbors of vertex v are
+    indices[indptr[v]:indptr[v+1]] (sorted, without duplicates or self loops). The vertices are the
+    variables occurring in hard clauses with at least two literals (see nodes). A networkx view of
+    the graph, which is used by the decomposition and display code, is built on first access of g.
+
+    Long clauses induce huge cliques. Therefore, the graph supports the following models:
+      - primal:    every clause induces a clique;
+      - incidence: every clause is a vertex adjacent to its variables (the incidence graph);
+      - auto:      clauses with more than *threshold* literals are clause vertices, the others cliques (default).
+    Clause vertices are numbered after the variables. Decompositions computed on the graph are mapped back
+    to bags of variables (a clause vertex is replaced by the variables of its clause), such that they are
+    tree decompositions of the primal graph.
+    """
+
+    def __init__(self, wcnf, external = False, twsolver = None, model = "auto", threshold = 32, twtimeout = None, batch = 1 << 22,
+                 cache = None):
+        self.wcnf      = wcnf
+        self.n         = wcnf.n
+        self.twsolvers = [twsolver] if isinstance(twsolver, str) else list(twsolver or [])
+        self.twsolver  = self.twsolvers[0] if self.twsolvers else None
+        self.twtimeout = twtimeout   # Seconds after which the external solver is asked for its best decomposition.
+        self.model     = model
+        self.threshold = threshold
+        self.members   = {}    # Maps clause vertices to the set of variables of their clause.
+        self.cache     = cache # A Cache in which decompositions are stored (keyed by @see fingerprint).
+        self._g        = None
+        self._fingerprint = None
+
+        # Collect the (deduplicated) edges of the cliques and clause vertices in batches.
+        (self.nodes, edges, size) = self._edges(external, batch)
+        self.m = len(edges)
+        self.n = max(self.n, size - 1)
+
+        # Build the CSR arrays from both directions of every edge.
+        arcs = np.sort(np.concatenate((edges, (edges % size) * size + edges // size)))
+        self.indices = arcs % size
+        self.indptr  = np.zeros(size + 1, dtype = np.int64)
+        np.cumsum(np.bincount(arcs // size, minlength = size), out = self.indptr[1:])
+        self._size   = size
+
+    def _edges(self, external, batch):
+        """
+        Returns the vertices, the edges (encoded as u * size + v with u < v), and the bound size on the vertex
+        names of the graph induced by the hard clauses. Clauses are grouped by length and all pairs of a group
+        are generated at once (in batches of at most *batch* pairs).
+        """
+        literals = np.abs(self.wcnf.hard.lits()).astype(np.int64)
+        bounds   = self.wcnf.hard.bounds()
+        if external:
+            # Rename to the original variables and drop auxiliary ones (as @see WCNF._to_external does).
+            literals = self.wcnf.varmap.keys(literals).astype(np.int64)
+            keep     = literals != 0
+            counts   = np.concatenate(([0], np.cumsum(keep)))
+            literals = literals[keep]
+            bounds   = counts[bounds]
+        lengths = np.diff(bounds)
+        base    = int(max(literals.max(initial = 0), self.n)) + 1
+
+        # Select the clauses that become clause vertices.
+        if self.model == "incidence":
+            hyper = np.flatnonzero(lengths >= 2)
+        elif self.model == "auto":
+            hyper = np.flatnonzero(lengths > self.threshold)
+            if len(hyper) > 0:
+                print(f"c Using clause vertices for {len(hyper)} clauses with more than {self.threshold} literals.")
+        else:
+            hyper = np.zeros(0, dtype = np.int64)
+        clique = np.ones(len(lengths), dtype = bool)
+        clique[hyper] = False
+        size = base + len(hyper)
+
+        # Every clause vertex is adjacent to the variables of its clause.
+        nodes, edges = [np.zeros(0, dtype = np.int64)], [np.zeros(0, dtype = np.int64)]
+        if len(hyper) > 0:
+            vertices = base + np.arange(len(hyper))
+            owner    = np.repeat(vertices, lengths[hyper])
+            members  = literals[np.concatenate([np.arange(bounds[c], bounds[c+1]) for c in hyper.tolist()])]
+            nodes.append(_sorted_unique(np.concatenate((vertices, members))))
+            edges.append(_sorted_unique(members * size + owner))
+            split = np.cumsum(lengths[hyper])[:-1]
+            self.members = {v: frozenset(m.tolist()) for (v, m) in zip(vertices.tolist(), np.split(members, split))}
+
+        # All other clauses induce cliques.
+        for k in np.unique(lengths[clique & (lengths >= 2)]).tolist():
+            starts = bounds[:-1][clique & (lengths == k)]
+            (i, j) = np.triu_indices(k, 1)
+            step   = max(1, batch // len(i))
+            for r in range(0, len(starts), step):
+                block = literals[starts[r:r+step, None] + np.arange(k)]
+                u, v  = block[:, i].ravel(), block[:, j].ravel()
+                u, v  = np.minimum(u, v)[u != v], np.maximum(u, v)[u != v]
+                nodes.append(_sorted_unique(block.ravel()))
+                edges.append(_sorted_unique(u * size + v))
+        return (_sorted_unique(np.concatenate(nodes)), _sorted_unique(np.concatenate(edges)), size)
+
+    def fingerprint(self):
+        """
+        Returns a hash of the graph (of its CSR arrays over the internal variables and clause vertices).
+        """
+        if self._fingerprint is None:
+            self._fingerprint = digest([np.int64(self.n).tobytes(), self.indptr.tobytes(), self.indices.tobytes()])
+        return self._fingerprint
+
+    def _cached(self, kind, compute, *params):
+        """
+        Returns compute() or, if a cache is set, the result stored for this graph, the kind, and the parameters.
+        """
+        if self.cache is None:
+            return compute()
+        (key, kind) = (self.fingerprint(), f"{kind}-{digest(repr(params).encode())[:16]}")
+        value = self.cache.get(key, kind)
+        if value is None:
+            value = compute()
+            self.cache.put(key, kind, value)
+        print(f"c ├─ Decomposition cache: {self.cache.stats()}.")
+        return value
+
+    def _to_variables(self, bag):
+        """
+        Maps a set of vertices to the set of variables it represents (clause vertices are replaced by their variables).
+        """
+        if not self.members:
+            return frozenset(bag)
+        variables = set()
+        for v in bag:
+            variables.update(self.members.get(v, (v,)))
+        return frozenset(variables)
+
+    def _map_width_td(self, width, td):
+        """
+        Maps a decomposition with @see _map_td and recomputes its width (if clause vertices are present).
+        """
+        if not self.members:
+            return (width, td)
+        td = self._map_td(td)
+        return (max((len(bag) for bag in td.nodes), default = 0) - 1, td)
+
+    def _map_td(self, td):
+        """
+        Maps an (undirected) tree decomposition of the graph to one with bags of variables (@see _to_variables).
+        Bags that become subsets of their parent are contracted into it, which also avoids duplicated bags.
+        """
+        if not self.members or len(td) == 0:
+            return td
+        mapped = nx.Graph()
+        root   = next(iter(td.nodes))
+        rep    = {root: self._to_variables(root)}
+        mapped.add_node(rep[root])
+        for (parent, child) in nx.bfs_edges(td, root):
+            bag = self._to_variables(child)
+            if bag <= rep[parent]:
+                rep[child] = rep[parent]
+            else:
+                rep[child] = bag
+                mapped.add_edge(rep[parent], bag)
+        return mapped
+
+    def neighbors(self, v):
+        """
+        Returns the (sorted) neighbors of v as array.
+        """
+        if v >= self._size:
+            return self.indices[:0]
+        return self.indices[self.indptr[v]:self.indptr[v+1]]
+
+    def degree(self, v):
+        return len(self.neighbors(v))
+
+    def edges(self):
+        """
+        Returns all edges as two arrays (u, v) with u < v.
+        """
+        source = np.repeat(np.arange(self._size), np.diff(self.indptr))
+        mask   = source < self.indices
+        return (source[mask], self.indices[mask])
+
+    def components(self):
+        """
+        Returns the connected components as array of labels over the vertex names (including clause vertices),
+        where the label of a vertex is the smallest vertex of its component (unused names are their own component).
+        The labels are computed by a vectorized union-find: the roots of both ends of every edge are hooked under the
+        smaller one and all paths are compressed, until the ends of every edge have the same root.
+        """
+        labels = np.arange(self._size, dtype = np.int64)
+        (u, v) = self.edges()
+        while True:
+            (a, b) = (labels[u], labels[v])
+            if np.array_equal(a, b):
+                return labels
+            np.minimum.at(labels, np.maximum(a, b), np.minimum(a, b))
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+
+    @property
+    def g(self):
+        """
+        A networkx view of the graph (built on first access and cached afterwards).
+        """
+        if self._g is None:
+            (u, v)  = self.edges()
+            self._g = nx.Graph()
+            self._g.add_nodes_from(self.nodes.tolist())
+            self._g.add_edges_from(zip(u.tolist(), v.tolist()))
+        return self._g
+
+    def compute_tree_decomposition(self, heuristic = "deg", restarts = 1, budget = 10):
         """
         Computes a tree decomposition of this graph.
         If `self.twsolver` is set, the decomposition is computed with the external solver.
-        Otherwise it is computed with the networkx heuristic (min_degree or min_fill_in).
+        Otherwise it is computed with an elimination heuristic (min_degree or min_fill_in, @see _elimination),
+        which is run *restarts* times with randomized tie-breaking, or by nested dissection (heuristic = "nd").
+
+        If the external solver fails for whatever reason, this functions falls back to the heuristic as well.
+
+        With heuristic = "portfolio", the heuristics and all external solvers (twsolver may be a list of commands)
+        run in parallel for *budget* seconds and the decomposition with the least DP cost is used (@see portfolio).
 
-        If the external solver fails for whatever reason, this functions falls back to networkx as well.
+        If a cache is set, the decomposition is looked up there first (and stored after it was computed).
         """
-        # If an external solver is defined, try to use it.
-        if self.twsolver is not None:
-            wtd = self._compute_tree_decomposition_external()
-            if wtd is not None: # If it worked, we return the result, otherwise we fallback to networkx.
-                (width, td) = wtd
-                td, root = self._root_td(td) 
-                return (width, td, root)
-            
-        # Compute a tree decomposition with a networkx heuristic.
-        if heuristic == "fillin":
-            (width, td) = nx.algorithms.approximation.treewidth_min_fill_in(self.g)
-        else:
-            (width, td) = nx.algorithms.approximation.treewidth_min_degree(self.g)
+        (width, td) = self._cached("td", lambda: self._tree_decomposition(heuristic, restarts, budget),
+                                   heuristic, restarts, budget, self.twsolvers)
 
         # find a suitable root
         td, root = self._root_td(td)            
@@ -77,92 +377,63 @@ class PrimalGraph:
         # done
         return (width, td, root)
 
+    def _tree_decomposition(self, heuristic, restarts, budget):
+        """
+        Computes the (unrooted) tree decomposition (width, td) of @see compute_tree_decomposition.
+        """
+        if heuristic == "portfolio":
+            print("c Computing a tree decomposition with a portfolio.")
+            return portfolio(self, self.write, self.twsolvers, budget, prepare = self._map_width_td)
+
+        # If an external solver is defined, try to use it.
+        if self.twsolver is not None:
+            wtd = self._compute_tree_decomposition_external()
+            if wtd is not None: # If it worked, we return the result, otherwise we fall back to the heuristic.
+                return self._map_width_td(*wtd)
+            
+        # Compute a tree decomposition with an elimination heuristic (directly on the CSR arrays).
+        if heuristic == "fillin":
+            (width, td) = treewidth_min_fill_in(self, restarts = restarts)
+        elif heuristic == "nd":
+            (width, td) = nested_dissection(self.g)
+        else:
+            (width, td) = treewidth_min_degree(self, restarts = restarts)
+        return self._map_width_td(width, td)
+
     def _compute_tree_decomposition_external(self):
         """
-        Compute a tree decomposition with an external solver.
+        Compute a tree decomposition with an external solver (which is stopped after `self.twtimeout` seconds).
         This returns None if the subprocess fails.
         This method is used by @see compute_tree_decomposition and should not be called directly.
         """
-        # Generate a temporary file to store the graph.
-        with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8') as temp_file:                
-            temp_file.write(str(self))
-            temp_file.flush()
-        try:
-            # Call the external treewidth solver.
-            result      = subprocess.run(self.twsolver + " < " + temp_file.name, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output      = result.stdout
-            (width, td) = (0,nx.Graph())
-            bags        = {}
-            # Parse the results and read the decomposition.
-            if result.returncode == 0:
-                for line in output.splitlines():
-                    if line.startswith("s") or line.startswith("c"):
-                        continue
-                    elif line.startswith("b"):
-                        ll  = line.strip().split(" ")
-                        b   = int(ll[1])
-                        bag = frozenset(map(int,ll[2:]))
-                        bags[b] = bag
-                        if len(bag) > width:
-                            width = len(bag)
-                            td.add_node(bag)
-                    else:
-                        e = list(map(int, line.split(" ")))
-                        td.add_edge(bags[e[0]], bags[e[1]])
-            else:
-                print("c Treewidth solver failed with an error.")
-                return None # If we fail, we return None.
-        except subprocess.CalledProcessError as e:
-            print("c Error executing the treewidth solver:", e)
-            return None # If we fail, we return None.
-        finally:
-            # Clean up -> close and remove temporary files.
-            temp_file.close()
-            os.remove(temp_file.name)
-        return (width,td)
+        return external_decomposition(self.twsolver, self.write, timeout = self.twtimeout)
 
+    def _root_td(self, td, fanin = None):
+        """
+        Roots the given tree decomposition at the bag of least estimated DP cost (and returns a new directed decomposition
+        with an empty artificial root, @see root_decomposition).
+        """
+        return root_decomposition(td, fanin)
     
-    def _root_td(self, td):
-        """
-        Heuristically root the given tree decomposition (and returns a new directed decomposition).
-        """
-        # find a root and generate a directed graph
-        root    = next(iter(td.nodes))
-        digraph = nx.DiGraph()
-
-        # perform a bfs to point edges towards the root
-        queue   = [root]
-        visited = set()
-        visited.add(root)
-        while queue:            
-            v = queue.pop()
-            for w in td.neighbors(v):
-                if w in visited:
-                    continue
-                # edges to child nodes
-                digraph.add_edge(v, w)  #works with nx.dfs_postorder_nodes
-                queue.append(w)
-                visited.add(w)
-
-        # add empty artificial root
-        aroot = frozenset()
-        digraph.add_edge(aroot, root)
-        root = aroot
-        # mark the root and the leaves
-        digraph.nodes[root]['root'] = True
-        for v in digraph.nodes:
-            if digraph.out_degree(v) == 0: #works with nx.dfs_postorder_nodes
-                digraph.nodes[v]['leaf'] = True
-        
-        return digraph, root
-    
-    def compute_torso_decomposition(self, timeout = 60):
+    def compute_torso_decomposition(self, timeout = 60, heuristic = "fillin", budget = 10, fanin = None, method = "clingo",
+                                    threads = 1, steps = 1, k = 60, on_torso = None, max_width = 20):
         """
         Computes a subset of the graph called the torso, which hopefully has small treewidth.
         The remaining parts of the graph are connected as huge bags to a tree decomposition of the torso.
 
         Optional Arguments:
-          - timeout: Number of seconds allowed to compute a torso (default 60).
+          - timeout:   Number of seconds allowed to compute a torso (default 60).
+          - heuristic: How the torso is decomposed, either "fillin", "nd", or "portfolio" (@see compute_tree_decomposition).
+          - budget:    Number of seconds used by the portfolio (default 10).
+          - fanin:     Maximum number of children of a bag in the rooted decomposition (@see root_decomposition).
+          - method:    How the torso is searched, either with "clingo" or by a "native" local search (@see Torso).
+          - threads:   Number of threads used by clingo.
+          - steps:     Number of steps in which clingo adds candidates to the search (@see Torso).
+          - k:         Number of candidates from which the torso is chosen (per step of clingo, default 60).
+          - on_torso:  Called with every improved torso while the search is running (once with a cached torso).
+          - max_width: Largest width of the torso for which the decomposition is returned (default 20).
+
+        If a cache is set, the torso and its decomposition are looked up there first (@see fingerprint).
         
         Returns a four-tuple:
           - the width of the torso
@@ -174,69 +445,104 @@ class PrimalGraph:
         """
         print("c Computing a torso-decomposition.")
         
-        # First compute the torso.
-        torso_nodes = Torso(self.g, timeout = timeout)
+        # First compute the torso (a torso from the cache is reported to on_torso as well).
+        searched    = []
+        def search():
+            searched.append(True)
+            return Torso(self.g, k = k, timeout = timeout, method = method, threads = threads, steps = steps, on_torso = on_torso)
+        torso_nodes = self._cached("torso", search, timeout, method, threads, steps, k)
+        if on_torso is not None and not searched:
+            on_torso(list(torso_nodes))
         torso_graph = nx.Graph(self.g.subgraph(torso_nodes))
         
         # Complete the boarders of the torso into cliques.        
-        h = nx.Graph(self.g)
-        h.remove_nodes_from(torso_nodes)
-        n_cc = 0
-        for c in nx.connected_components(h):
+        outside = tms._torso_boundaries(self.g, torso_nodes)
+        n_cc    = 0
+        for (c, neighbors) in outside:
             if len(c) == 1:
                 n_cc += 0.2
             elif len(c) == 2:
                 n_cc += 0.5
             else:
                 n_cc += 1
-            for (u,v) in itertools.combinations(tms._neighbors_of_set_in(self.g, c, torso_nodes), 2):
-                torso_graph.add_edge(u, v)
+            torso_graph.add_edges_from(itertools.combinations(neighbors, 2))
 
         # Logging
         print(f"c ├─ Computed a torso with {len(torso_graph.nodes)} vertices and {len(torso_graph.edges)} edges.")
                 
         # Compute a tree decomposition of the torso.
-        (width, td) = nx.algorithms.approximation.treewidth_min_fill_in(torso_graph)
+        def decompose():
+            if heuristic == "portfolio":
+                edges = tuple(zip(*torso_graph.edges)) or ((), ())
+                write = lambda file: write_pace(file, self.n, (np.array(edges[0], dtype = np.int64), np.array(edges[1], dtype = np.int64)))
+                return portfolio(torso_graph, write, self.twsolvers, budget, prepare = self._map_width_td)
+            elif heuristic == "nd":
+                return self._map_width_td(*nested_dissection(torso_graph))
+            return self._map_width_td(*treewidth_min_fill_in(torso_graph))
+        (width, td) = self._cached("torso-td", decompose, sorted(torso_nodes), heuristic, budget, self.twsolvers)
         print(f"c ├─ Treewidth of the torso: {width:6}")
         print(f"c ├─ Torso splits into {n_cc} components.")
         print( "c └─────────────────────────────────────")
         
         # Catch trivial cases-
-        if width > 10 or (n_cc > 0 and n_cc < 2):
+        if width > max_width or (n_cc > 0 and n_cc < 2):
             return None
         
         # Compute the torso decomposition by adding the remaining components.
         torso_td = nx.Graph(td)
         
         # Root the decomposition.
-        torso_td, root = self._root_td(torso_td)
-
-        for c in nx.connected_components(h):
-            neighbors = tms._neighbors_of_set_in(self.g, c, torso_nodes)
-            node      = frozenset(c.union(neighbors))
-            for bag in torso_td.nodes:
-                if neighbors.issubset(bag):
-                    torso_td.add_edge(bag, node)
-                    torso_td.nodes[node]['sub'] = True
-                    break
+        torso_td, root = self._root_td(torso_td, fanin)
+        td_nodes       = set(torso_td.nodes)    # The bags of the torso (without the remaining components).
 
-        # Original nodes
-        torso_nodes = set(td.nodes)
-        torso_nodes.add(frozenset())    #_root_td adds an empty root that would be missing from torso_nodes
+        # Index the bags of the torso by their vertices, such that the bag of a component is found by intersecting
+        # the bags of its boundary (starting with its rarest vertex). Ties are broken by the order of the bags.
+        # With clause vertices, the bag of a component may cover no new variable (it is contracted into its parent, as in
+        # @see _map_td) or repeat another bag (it becomes a distinct copy, such that the decomposition stays a tree).
+        bags  = list(torso_td.nodes)
+        index = {}
+        copy  = itertools.count(1)
+        for (i, bag) in enumerate(bags):
+            for v in bag:
+                index.setdefault(v, []).append(i)
+        for (c, neighbors) in outside:
+            node      = self._to_variables(c.union(neighbors))
+            neighbors = sorted(self._to_variables(neighbors), key = lambda v: len(index.get(v, ())))
+            if not neighbors:
+                candidates = [0]
+            else:
+                candidates = index.get(neighbors[0], [])
+                for v in neighbors[1:]:
+                    if not candidates:
+                        break
+                    candidates = [i for i in candidates if v in bags[i]]
+            if candidates:
+                parent = bags[min(candidates)]
+                if node <= parent:
+                    continue
+                if node in torso_td:
+                    node = Bag(node, next(copy))
+                torso_td.add_edge(parent, node)
+                torso_td.nodes[node]['sub'] = True
 
         # done
-        return (width, torso_td, root, torso_nodes)
+        return (width, torso_td, root, td_nodes)
                             
+    def write(self, file, batch = 1 << 16):
+        """
+        Writes the graph in the format of PACE to the given text file object, such as the input pipe of an
+        external treewidth solver (@see write_pace, which writes *batch* edges at a time).
+        """
+        write_pace(file, self.n, self.edges(), batch)
+
     def __str__(self):
         """
         Prints the graph in the format of PACE (which is similar to the DIMACS format).
         Comments will be used to indicate the labels.
         """
-        buffer = []
-        buffer.append(format(f"p tw {self.n} {len(self.g.edges)}"))
-        for (u,v) in self.g.edges:
-            buffer.append(format(f"{u} {v}"))
-        return "\n".join(buffer)
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()[:-1]
 
     def display(self, separation = None):
         """
@@ -267,6 +573,6 @@ class PrimalGraph:
         
         plt.gcf().canvas.manager.set_window_title('Torso Decomposition')
         plt.text(0.025,0.95, format(f"Torsowidth:  {width}"), transform=plt.gca().transAxes, fontsize=10, fontfamily='monospace')
-        plt.text(0.025,0.92, format(f"Nodes/Edges: {len(self.g)}/{len(self.g.edges)}"),    transform=plt.gca().transAxes, fontsize=10, fontfamily='monospace')
+        plt.text(0.025,0.92, format(f"Nodes/Edges: {len(self.nodes)}/{self.m}"),    transform=plt.gca().transAxes, fontsize=10, fontfamily='monospace')
         plt.show()
 
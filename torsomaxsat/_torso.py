@@ -1,10 +1,6 @@
 import torsomaxsat as tms
 import networkx    as nx
-import itertools
-
-import clingo
-from clingo import Control
-import threading
+import itertools, random, math, time, copy
 
 clingo_program = """
 % We can selected candidate vertices to the torso.
@@ -30,24 +26,47 @@ component(C,Y) :- component(C,X), not torso(X), edge(Y,X).
 :~ torso(X), torso(Y), edge(X,Y). [1,X,Y]                  % induced edges
 """
 
-def Torso(g, cost = 8, k = 60, timeout = 60):        
+def Torso(g, cost = 8, k = 60, timeout = 60, method = "clingo", threads = 1, steps = 1, on_torso = None):        
     """
     Initializes a torso for the given graph *g*, which is computed on initialization with cling.
     
     args:
-        cost:    Point given to nodes added to the torso in the optimization.
-        k:       Number of candidates from which the torso is chosen.
-        timeout: Maximum time in seconds used to find a torso.
+        cost:     Point given to nodes added to the torso in the optimization.
+        k:        Number of candidates from which the torso is chosen (per step).
+        timeout:  Maximum time in seconds used to find a torso.
+        method:   Either "clingo" or "native", which uses a local search with the same objective instead (@see _native_torso).
+        threads:  Number of threads of clingo (which then runs a portfolio of competing configurations).
+        steps:    Number of solving steps, each adding the next k candidates (@see _clingo_torso).
+        on_torso: Called with every improved torso as soon as it is found.
+    """
+    if method == "native":
+        print("c ├─ Computing the real torso with a local search.")
+        torso = _native_torso(_pretorso(g, k), cost, timeout)
+        if on_torso is not None:
+            on_torso(torso)
+        return torso
+    return _clingo_torso(g, cost, k, timeout, threads, steps, on_torso)
+
+def _clingo_torso(g, cost, k, timeout, threads, steps, on_torso):
+    """
+    Searches the torso with clingo, using multi-shot solving: the program is grounded once for the pre torsos of all
+    k * steps candidates, whose vertices and edges are external atoms. The i-th step makes the first k * i candidates
+    and the edges of their pre torso true and solves again (reusing the grounding and what the solver has learned).
+    Every step gets an equal share of the remaining time.
     """
-    # Setup Clingo.
-    control = Control()             
+    from clingo import Control, Function, Number
+    control = Control(["--parallel-mode", f"{max(1, threads)},compete"])             
     control.configuration.solver.opt_strategy   = "usc,pmres,disjoint,stratify"
     control.configuration.solver.opt_usc_shrink = "min"
     control.configuration.solve.opt_mode        = "opt"
     control.configuration.solve.solve_limit     = "umax,umax"
     
-    # Add the the pre torso of the graph as relational structure and provide the logic program.
-    control.add("base", [], _graph2structure(_pretorso(g,k)))
+    # Compute the pre torsos of all steps and declare their vertices and edges as externals.
+    print("c ├─ Computing nodes of the pre torso.")
+    candidates = _candidates(g, k * steps)
+    pretorsos  = [_pretorso(g, k, candidates[:k*i]) for i in range(1, steps + 1)]
+    edges      = {(min(u, v), max(u, v)) for p in pretorsos for (u, v) in p.edges}
+    control.add("base", [], _graph2structure(candidates, edges))
     control.add("base", [], clingo_program.replace("@cost", str(cost)))    
     
     # Ground the Program.
@@ -56,36 +75,191 @@ def Torso(g, cost = 8, k = 60, timeout = 60):
 
     # Define hat to do with answer sets.
     torso = []
+    best  = [None]
     def model_callback(model):            
+        if best[0] is not None and model.cost >= best[0]:
+            return # Not better than the torso of a previous step.
+        best[0] = model.cost
         torso.clear()
         for a in [atom for atom in model.symbols(shown=True) if atom.name == "torso"]:
             torso.append(a.arguments[0].number)
         print(f"c ├─── Found a new torso of size {len(torso)}.")
+        if on_torso is not None:
+            on_torso(list(torso))
 
-    # Pack everything to a function ...
-    def solver(control, model_callback):
-        control.solve(on_model = model_callback)
-
-    # .. and execute it in a thread with the given timeout.
+    # Solve the steps, each with an equal share of the remaining time.
     print("c ├─ Computing the real torso with Clingo.")
-    t = threading.Thread(target=solver, args=(control, model_callback))
-    t.start()
-    t.join(timeout)
-    control.interrupt()
-    t.join()          
+    deadline = time.time() + timeout
+    for (i, p) in enumerate(pretorsos):
+        for v in candidates[:k*(i+1)]:
+            control.assign_external(Function("node", [Number(v)]), True)
+        present = {(min(u, v), max(u, v)) for (u, v) in p.edges}
+        for (u, v) in edges:
+            control.assign_external(Function("edge", [Number(u), Number(v)]), (u, v) in present)
+        with control.solve(on_model = model_callback, async_ = True) as handle:
+            handle.wait(max(0, (deadline - time.time()) / (steps - i)))
+            handle.cancel()
 
     # done
     return torso
 
-def _pretorso(g, k):
+class _TorsoSearch:
     """
-    Computes a pre torso in which we search the real torso via ASP.
-    The pre torso is a graph obtained by a subset of vertices of g selected by a heuristic.
-    Components outside of this selection are made into cliques.
-    """   
-    # Select k vertices with small degree to the previously selected nodes and high degree to the others.
-    print("c ├─ Computing nodes of the pre torso.")
-    candidates = set()
+    The state of the local search for a torso T in the pre torso p, which maximizes the objective of the logic
+    program: cost * |T| minus the number of edges of the torso graph (the edges of p within T together with
+    the cliques on the boundaries of the components of p - T).
+
+    The state stores the components outside of T with their boundaries, and for every pair of vertices in T the
+    number of reasons for their edge in the torso graph (being adjacent in p or sharing a boundary). A move
+    flips one vertex and is evaluated against the edges that appear or disappear at the boundaries it touches.
+    """
+
+    def __init__(self, p, cost):
+        self.adj   = {v: set(p.adj[v]) - {v} for v in p.nodes}
+        self.cost  = cost
+        self.torso = set(self.adj)
+        self.reasons = {}
+        for v in self.adj:
+            for w in self.adj[v]:
+                if v < w:
+                    self.reasons[(v, w)] = 1
+        self.edges = len(self.reasons)
+        self.comp  = {}   # The component (id) of every vertex outside of the torso.
+        self.comps = {}   # The vertices and the boundary of every component.
+        self.at    = {v: set() for v in self.adj}   # The components whose boundary contains a vertex.
+        self.ids   = itertools.count()
+
+    def value(self):
+        return self.cost * len(self.torso) - self.edges
+
+    def _pairs(self, vertices, d, changes):
+        vertices = sorted(vertices)
+        for (i, v) in enumerate(vertices):
+            for w in vertices[i+1:]:
+                changes[(v, w)] = changes.get((v, w), 0) + d
+
+    def _split(self, vertices, torso):
+        # The components of the given vertices (outside of the torso) with their boundaries in the torso.
+        result, seen = [], set()
+        for v in vertices:
+            if v in seen:
+                continue
+            component, boundary, queue = {v}, set(), [v]
+            seen.add(v)
+            while queue:
+                u = queue.pop()
+                for w in self.adj[u]:
+                    if w in torso:
+                        boundary.add(w)
+                    elif w in vertices and w not in seen:
+                        seen.add(w)
+                        component.add(w)
+                        queue.append(w)
+            result.append((component, boundary))
+        return result
+
+    def move(self, v):
+        """
+        Evaluates flipping v. Returns the change of the objective and the plan (the components that are
+        replaced, the new components, and the changes of the reasons) to be executed with @see apply.
+        """
+        changes = {}
+        if v in self.torso:
+            # v leaves the torso and merges with the components at its boundary.
+            old       = list(self.at[v])
+            neighbors = self.adj[v] & self.torso
+            for c in old:
+                self._pairs(self.comps[c][1], -1, changes)
+            for w in neighbors:
+                changes[(min(v, w), max(v, w))] = changes.get((min(v, w), max(v, w)), 0) - 1
+            vertices  = {v}.union(*(self.comps[c][0] for c in old))
+            boundary  = (neighbors.union(*(self.comps[c][1] for c in old))) - {v}
+            new       = [(vertices, boundary)]
+            self._pairs(boundary, 1, changes)
+            gain      = -self.cost
+        else:
+            # v joins the torso and splits its component.
+            old       = [self.comp[v]]
+            (vertices, boundary) = self.comps[old[0]]
+            self._pairs(boundary, -1, changes)
+            new       = self._split(vertices - {v}, self.torso | {v})
+            for (_, b) in new:
+                self._pairs(b, 1, changes)
+            for w in self.adj[v] & self.torso:
+                changes[(min(v, w), max(v, w))] = changes.get((min(v, w), max(v, w)), 0) + 1
+            gain      = self.cost
+        appear    = sum(1 for (pair, d) in changes.items() if d > 0 and self.reasons.get(pair, 0) == 0)
+        disappear = sum(1 for (pair, d) in changes.items() if d < 0 and self.reasons.get(pair, 0) + d == 0)
+        return (gain - appear + disappear, (old, new, changes, appear - disappear))
+
+    def apply(self, v, plan):
+        (old, new, changes, edges) = plan
+        for c in old:
+            (vertices, boundary) = self.comps.pop(c)
+            for u in boundary:
+                self.at[u].discard(c)
+        for (pair, d) in changes.items():
+            r = self.reasons.get(pair, 0) + d
+            if r == 0:
+                self.reasons.pop(pair, None)
+            else:
+                self.reasons[pair] = r
+        self.edges += edges
+        if v in self.torso:
+            self.torso.discard(v)
+            self.at[v].clear()
+        else:
+            self.torso.add(v)
+            del self.comp[v]
+        for (vertices, boundary) in new:
+            c = next(self.ids)
+            self.comps[c] = (vertices, boundary)
+            for u in vertices:
+                self.comp[u] = c
+            for u in boundary:
+                self.at[u].add(c)
+
+def _native_torso(p, cost, timeout, seed = 42, steps = 50, restarts = 4):
+    """
+    Searches a torso in the pre torso p with the objective of the logic program (@see _TorsoSearch). Starting with
+    all vertices in the torso, the best flips are applied greedily while they improve the objective. Then *restarts*
+    runs of simulated annealing start from the greedy torso, each performing *steps* random flips per vertex
+    (with a geometrically cooling temperature). The search stops after *timeout* seconds and returns the best torso found.
+    """
+    tstart = time.time()
+    greedy = _TorsoSearch(p, cost)
+    while True:
+        best = max(((greedy.move(v), v) for v in greedy.adj), key = lambda m: m[0][0], default = None)
+        if best is None or best[0][0] <= 0:
+            break
+        greedy.apply(best[1], best[0][1])
+    (value, torso) = (greedy.value(), set(greedy.torso))
+
+    rng      = random.Random(seed)
+    vertices = list(greedy.adj)
+    total    = steps * len(vertices)
+    for _ in range(restarts):
+        state = copy.deepcopy(greedy)
+        for step in range(total):
+            if time.time() - tstart > timeout:
+                break
+            temperature = cost * 0.01 ** (step / total)
+            v = rng.choice(vertices)
+            (gain, plan) = state.move(v)
+            if gain >= 0 or rng.random() < math.exp(gain / temperature):
+                state.apply(v, plan)
+                if state.value() > value:
+                    (value, torso) = (state.value(), set(state.torso))
+    print(f"c ├─── Found a torso of size {len(torso)} (objective {value}) in {time.time()-tstart:.2f}s.")
+    return sorted(torso)
+
+def _candidates(g, k):
+    """
+    Selects k vertices with small degree to the previously selected vertices and high degree to the others
+    (in the order of their selection, so that a prefix of the result is the selection for a smaller k).
+    """
+    candidates = []
+    selected   = set()
     scores     = [0]
     queue      = tms.PriorityQueue()
     for v in g.nodes:
@@ -102,31 +276,44 @@ def _pretorso(g, k):
                 break # otherwise the this is an outdated element
         if v is None:
             break # queue did not contain any remaining elements
-        if v in candidates:
+        if v in selected:
             continue
-        candidates.add(v)
+        candidates.append(v)
+        selected.add(v)
         for w in g.neighbors(v):
             scores[w] -= 2 # We reduce two, to punish edges within the candidates
             queue.push(w, scores[w])
+    return candidates
+
+def _pretorso(g, k, candidates = None):
+    """
+    Computes a pre torso in which we search the real torso via ASP.
+    The pre torso is a graph obtained by a subset of vertices of g selected by a heuristic (@see _candidates).
+    Components outside of this selection are made into cliques.
+    """   
+    if candidates is None:
+        print("c ├─ Computing nodes of the pre torso.")
+        candidates = _candidates(g, k)
+    candidates = set(candidates)
         
     # Computing the torso graph of these vertices.
     pretorso = nx.Graph(g.subgraph(candidates))
-    t = nx.Graph(g)
-    t.remove_nodes_from(candidates)
-    for c in nx.connected_components(t):
-        for (u,v) in itertools.combinations(tms._neighbors_of_set_in(g, c, candidates), 2):
-                pretorso.add_edge(u, v)            
+    for (_, boundary) in tms._torso_boundaries(g, candidates):
+        pretorso.add_edges_from(itertools.combinations(boundary, 2))
 
     print(f"c ├─ Computed a pre torso with {len(pretorso.nodes)} vertices and {len(pretorso.edges)} edges.")
     return pretorso
 
-def _graph2structure(graph):
+def _graph2structure(nodes, edges):
+    """
+    Declares the given vertices and edges (u < v) as external atoms node(v) and edge(u,v), which are false until assigned.
+    """
     facts = []
 
-    for node in graph.nodes:
-        facts.append(f"node({node}).")
+    for node in nodes:
+        facts.append(f"#external node({node}).")
 
-    for edge in graph.edges:
-        facts.append(f"edge({edge[0]}, {edge[1]}).")
+    for (u, v) in edges:
+        facts.append(f"#external edge({u},{v}).")
 
     return "\n".join(facts)
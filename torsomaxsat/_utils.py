@@ -1,24 +1,114 @@
 from itertools import chain, combinations
+import subprocess, threading
+import numpy as np
 
 def powerset(iterable):
     "powerset([1,2,3]) --> () (1,) (2,) (3,) (1,2) (1,3) (2,3) (1,2,3)"
     s = list(iterable)
     return chain.from_iterable(combinations(s, r) for r in range(len(s)+1))
 
+def popen_with_input(cmd, write, **kwargs):
+    """
+    Starts the command *cmd* (a shell command string or an argument list, which is executed without a shell)
+    and streams its input from a separate thread by calling write(stdin).
+    The caller can read the output of the process while the input is still produced.
+
+    Returns the process (with a text stdout pipe) and the writer thread.
+    """
+    process = subprocess.Popen(cmd, shell=isinstance(cmd, str), text=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, **kwargs)
+    def feed():
+        try:
+            write(process.stdin)
+            process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass # The process does not want to read (all of) its input.
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    return process, writer
+
 class BiMap:
+    __slots__ = 'key_to_value', 'value_to_key'
+    """
+    A bijection between positive integers, stored in two dense arrays.
+    Unmapped keys and values are marked with 0. Besides the single element access, the
+    map provides batch translations of whole arrays of keys or values.
+
+    Slots:
+      key_to_value: int32 array, key_to_value[k] is the value of key k (or 0).
+      value_to_key: int32 array, value_to_key[v] is the key of value v (or 0).
+    """
+
     def __init__(self):
-        self.key_to_value = {}
-        self.value_to_key = {}
+        self.key_to_value = np.zeros(1, dtype = np.int32)
+        self.value_to_key = np.zeros(1, dtype = np.int32)
+
+    def _grow(self, max_key, max_value):
+        """
+        Ensures that the arrays can store the given key and value.
+        """
+        if max_key >= len(self.key_to_value):
+            buffer = np.zeros(max(2 * len(self.key_to_value), max_key + 1), dtype = np.int32)
+            buffer[:len(self.key_to_value)] = self.key_to_value
+            self.key_to_value = buffer
+        if max_value >= len(self.value_to_key):
+            buffer = np.zeros(max(2 * len(self.value_to_key), max_value + 1), dtype = np.int32)
+            buffer[:len(self.value_to_key)] = self.value_to_key
+            self.value_to_key = buffer
 
     def insert(self, key, value):
+        self._grow(key, value)
         self.key_to_value[key]   = value
         self.value_to_key[value] = key
 
+    def insert_all(self, keys, values):
+        """
+        Inserts all pairs of the two given arrays.
+        """
+        if len(keys) == 0:
+            return
+        self._grow(int(np.max(keys)), int(np.max(values)))
+        self.key_to_value[keys]   = values
+        self.value_to_key[values] = keys
+
     def get_value(self, key):
-        return self.key_to_value.get(key)
+        value = int(self.key_to_value[key]) if key < len(self.key_to_value) else 0
+        return value if value else None
 
     def get_key(self, value):
-        return self.value_to_key.get(value)
+        key = int(self.value_to_key[value]) if value < len(self.value_to_key) else 0
+        return key if key else None
+
+    def values(self, keys):
+        """
+        Translates an array of keys to their values (0 for unmapped keys).
+        """
+        keys = np.asarray(keys, dtype = np.int64)
+        if len(keys) == 0 or keys.max() < len(self.key_to_value):
+            return self.key_to_value[keys]
+        return np.where(keys < len(self.key_to_value), self.key_to_value[np.minimum(keys, len(self.key_to_value) - 1)], 0)
+
+    def keys(self, values):
+        """
+        Translates an array of values to their keys (0 for unmapped values).
+        """
+        values = np.asarray(values, dtype = np.int64)
+        if len(values) == 0 or values.max() < len(self.value_to_key):
+            return self.value_to_key[values]
+        return np.where(values < len(self.value_to_key), self.value_to_key[np.minimum(values, len(self.value_to_key) - 1)], 0)
+
+    def items(self):
+        """
+        Returns all pairs as two arrays (keys, values), ordered by value.
+        """
+        values = np.flatnonzero(self.value_to_key)
+        return self.value_to_key[values], values
+
+    def __contains__(self, key):
+        return self.get_value(key) is not None
+
+    def __len__(self):
+        return int(np.count_nonzero(self.value_to_key))
 
     def __str__(self):
-        return f'key_to_value: {self.key_to_value}\nvalue_to_key: {self.value_to_key}'
+        keys, values = self.items()
+        return f'key_to_value: {dict(zip(keys.tolist(), values.tolist()))}\nvalue_to_key: {dict(zip(values.tolist(), keys.tolist()))}'
@@ -1,68 +1,96 @@
-from torsomaxsat import BiMap
+import os, io, json, shutil, tempfile
+import numpy as np
+
+from torsomaxsat import BiMap, ClauseStore
 
 class WCNF:
-    __slots__ = 'n', 'hard', 'soft', 'negative', 'offset', 'varmap'
+    __slots__ = 'n', 'hard', 'soft', 'negative', 'offset', 'varmap', 'origin'
     """
     A *weighted* formula in conjunctive normal form with support for
     floating point weights (including negative weights).
 
     Slots:
       n:        Number of variables in the formula (internally, the variables are 1...n).
-      hard:     An array of hard clauses (every model needs to satisfy them).
+      hard:     A ClauseStore with the hard clauses (every model needs to satisfy them).
       soft:     A map from (some) variables to weights. Variables occurring in the map are soft auxiliary literals introduced by this class.
       negative: Stores soft literals whose weight was originally negative. 
       offset:   An value added to the value of the optimal model.
       varmap:   A BiMap from added variables to internal variables (needed, as auxiliary variables will be added on-the-fly).
+      origin:   A map from soft variables to the range (start, count) of hard clauses that encode their soft clause.
+                A soft variable without clauses (count 0) is a plain unit soft clause on that variable.
     """
 
+    # Version of the binary format written by @see save.
+    _format = 3
+
     def __init__(self):
         self.n        = 0
-        self.hard     = []
+        self.hard     = ClauseStore()
         self.soft     = {}
         self.negative = set()
         self.offset   = 0
         self.varmap   = BiMap()        
+        self.origin   = {}
 
-    def _sign(self, l):
-        """
-        Returns the sign of a literal as 1 or -1.
-        """
-        return 1 if l >= 0 else -1 
-        
     def _ensure_vars(self, clause):
         """
         Ensures that the variables of the given clause appear in the internal representation of the formula.
         """
-        for l in filter(lambda l: not self.varmap.get_value(abs(l)), clause):
-            self.n += 1
-            self.varmap.insert( abs(l), self.n )                    
-        
+        key_to_value = self.varmap.key_to_value
+        for v in map(abs, clause):
+            if v >= len(key_to_value) or not key_to_value[v]:
+                self.n += 1
+                self.varmap.insert( v, self.n )
+                key_to_value = self.varmap.key_to_value
+
     def _to_internal(self, clause):
         """
         Returns the given clause in internal representation (which eventually renames the variables).
         """
-        return list(map(lambda l: self._sign(l) * self.varmap.get_value(abs(l)), clause))
+        key_to_value = self.varmap.key_to_value
+        return [int(key_to_value[l]) if l > 0 else -int(key_to_value[-l]) for l in clause]
 
     def _to_external(self, clause):
         """
         Returns the given clause in the original representation (that is, with the original variable names).
         This function will also remove auxiliary variables from the clause.
         """
-        return list(map(
-            lambda l: self._sign(l) * self.varmap.get_key(abs(l)),
-            filter(lambda l: self.varmap.get_key(abs(l)), clause)
-        ))
+        clause = np.asarray(clause, dtype = np.int64)
+        keys   = self.varmap.keys(np.abs(clause))
+        return (np.sign(clause) * keys)[keys != 0].tolist()
+
+    def _get_weight(self, v):
+        """
+        Returns the original weight of the soft clause encoded by the soft variable v.
+        """
+        return -self.soft[v] if v in self.negative else self.soft[v]
+
+    def _soft_clause(self, v):
+        """
+        Reconstructs the soft clause (in internal representation) encoded by the soft variable v.
+        """
+        (start, count) = self.origin.get(v, (0, 0))
+        if count == 0:
+            return [] if v in self.negative else [v]
+        if v in self.negative:
+            return [-int(self.hard[i][0]) for i in range(start, start + count)]
+        return [l for l in self.hard[start].tolist() if l != -v]
 
-    def _get_weight(self, clause):
+    def soft_clauses(self):
         """
-        Returns the weight of a clause in internal representation.
-        If the clause has no weight (i.e., if it is hard), this will return float("inf").
+        Yields all soft clauses (in internal representation) together with their original weight.
         """
-        try:
-            soft_literal = next(filter(lambda l: self.soft.get(abs(l)), clause))            
-            return -self.soft[abs(soft_literal)] if abs(soft_literal) in self.negative else self.soft[abs(soft_literal)]
-        except StopIteration:
-            return float("inf")
+        for v in self.soft:
+            yield (self._soft_clause(v), self._get_weight(v))
+
+    def _fitness(self, model):
+        """
+        Returns the value of the given model of the internal representation (as 0/1 array),
+        that is, the sum of the weights of all satisfied soft variables.
+        """
+        variables = np.fromiter(self.soft.keys(), dtype = np.int64, count = len(self.soft))
+        satisfied = np.asarray(model)[variables - 1] > 0 if len(variables) > 0 else []
+        return sum(w for (w, s) in zip(self.soft.values(), satisfied) if s)
 
     def _max_fitness(self):
         """
@@ -75,11 +103,9 @@ class WCNF:
         Takes a model of the internal representation (as 0/1 array) and translates it into
         an external model (as array containing -v/v for each variable v).
         """
-        external_model = []
-        for v in self.varmap.key_to_value:
-            sign = 1 if model[self.varmap.get_value(v)-1] > 0 else -1
-            external_model.append( sign * v )
-        return external_model
+        keys, values = self.varmap.items()
+        signs        = np.where(np.asarray(model)[values-1] > 0, 1, -1)
+        return (signs * keys).tolist()
     
     def add_clause( self, clause, weight = None ):
         """
@@ -98,7 +124,7 @@ class WCNF:
         """
 
         # There is no need to add soft clauses of weight 0.
-        if weight and weight == 0: 
+        if weight is not None and weight == 0:
             return
 
         # If the weight is an integer, cast it as such.
@@ -118,6 +144,7 @@ class WCNF:
         if weight > 0:
             self.n += 1            
             clause.append(-self.n)
+            self.origin[self.n] = (len(self.hard), 1)
             self.hard.append(clause)
             self.soft[self.n] = weight
             return
@@ -125,6 +152,7 @@ class WCNF:
         # Here we have a soft clause with a negative weight.
         # We also add a unit soft clause, but enforce that it is set to true if the clause is satisfied.
         self.n += 1
+        self.origin[self.n] = (len(self.hard), len(clause))
         for l in clause:
             self.hard.append([-l, -self.n])
 
@@ -133,26 +161,187 @@ class WCNF:
         self.soft[self.n] = -weight
         self.offset      +=  weight
 
+    def add_clauses( self, literals, lengths, weights ):
+        """
+        Add many clauses at once. The clauses are given as one flat array of literals, an array with the
+        length of each clause, and an array with the weight of each clause (use float("inf") for hard clauses).
+
+        The result is the same as calling @see add_clause for every clause in order, but the
+        renaming of variables and the insertion into the clause store is performed in bulk.
+        Chunks containing soft clauses with negative weights are passed to @see add_clause one by one.
+        """
+        literals = np.asarray(literals, dtype = np.int64)
+        lengths  = np.asarray(lengths,  dtype = np.int64)
+        weights  = np.asarray(weights,  dtype = np.float64)
+        ends     = np.cumsum(lengths)
+
+        # Soft clauses of weight 0 are dropped and negative weights need the slow path.
+        if np.any(weights == 0):
+            keep = np.repeat(weights != 0, lengths)
+            literals, lengths, weights = literals[keep], lengths[weights != 0], weights[weights != 0]
+            ends = np.cumsum(lengths)
+        if np.any(weights < 0):
+            for (i,w) in enumerate(weights.tolist()):
+                clause = literals[ends[i]-lengths[i]:ends[i]].tolist()
+                if w == float("inf"):
+                    self.add_clause( clause )
+                else:
+                    self.add_clause( clause, weight = w )
+            return
+        soft = np.flatnonzero(np.isfinite(weights))
+
+        # New variables get their internal name in the order in which they appear, interleaved with the
+        # joker variables of soft clauses (which are created right after the literals of their clause).
+        variables, first, inverse = np.unique(np.abs(literals), return_index = True, return_inverse = True)
+        known  = self.varmap.values(variables)
+        fresh  = np.flatnonzero(known == 0)
+        events = np.concatenate((2 * first[fresh] + 1, 2 * ends[soft]))
+        order  = np.argsort(events, kind = "stable")
+        names  = np.empty(len(events), dtype = np.int64)
+        names[order] = np.arange(self.n + 1, self.n + len(events) + 1)
+        self.n += len(events)
+        known[fresh] = names[:len(fresh)]
+        jokers       = names[len(fresh):]
+        self.varmap.insert_all( variables[fresh], known[fresh] )
+
+        # Translate the literals and append the negated joker variables to the soft clauses.
+        internal = np.sign(literals) * known[inverse]
+        internal = np.insert(internal, ends[soft], -jokers)
+        lengths  = lengths.copy()
+        lengths[soft] += 1
+        for (v,i) in zip(jokers.tolist(), (soft + len(self.hard)).tolist()):
+            self.origin[v] = (i, 1)
+        self.hard.extend(internal, lengths)
+        for (v,w) in zip(jokers.tolist(), weights[soft].tolist()):
+            self.soft[v] = int(w) if w.is_integer() else w
+
+    def _add_soft( self, v, weight ):
+        """
+        Adds a unit soft clause on the variable v with a positive weight (without a joker variable).
+        """
+        self._ensure_vars([v])
+        v = self._to_internal([v])[0]
+        self.soft[v]   = weight
+        self.origin[v] = (0, 0)
+
+    def save( self, path ):
+        """
+        Stores the formula (in internal representation, including the variable map) in a binary format.
+        The result is a directory with one .npy file per array, which can be memory mapped by @see load.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        target = tempfile.mkdtemp(dir = parent)
+        arrays = {
+            "literals":      self.hard.lits(),
+            "offsets":       self.hard.bounds(),
+            "soft":          np.fromiter(self.soft.keys(),   dtype = np.int64,   count = len(self.soft)),
+            "weights":       np.fromiter(self.soft.values(), dtype = np.float64, count = len(self.soft)),
+            "negative":      np.fromiter(self.negative,      dtype = np.int64,   count = len(self.negative)),
+            "key_to_value":  self.varmap.key_to_value,
+            "value_to_key":  self.varmap.value_to_key,
+            "origin":        np.array([(v, i, k) for (v, (i, k)) in self.origin.items()], dtype = np.int64).reshape(-1, 3),
+        }
+        for (name, array) in arrays.items():
+            np.save(os.path.join(target, name + ".npy"), array)
+        with open(os.path.join(target, "meta.json"), "w") as file:
+            json.dump({"version": WCNF._format, "n": self.n, "offset": self.offset}, file)
+
+        # Replace an existing entry only after the new one is complete.
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(target, path)
+
+    @staticmethod
+    def load( path ):
+        """
+        Loads a formula stored with @see save. All arrays are memory mapped (copy-on-write), so loading does not depend on the size of the formula.
+        Returns None if the stored formula uses an outdated format.
+        """
+        with open(os.path.join(path, "meta.json")) as file:
+            meta = json.load(file)
+        if meta.get("version") != WCNF._format:
+            return None
+        arrays = {}
+        for name in ["literals", "offsets", "soft", "weights", "negative", "key_to_value", "value_to_key", "origin"]:
+            arrays[name] = np.load(os.path.join(path, name + ".npy"), mmap_mode = "c")
+
+        phi          = WCNF()
+        phi.n        = meta["n"]
+        phi.offset   = meta["offset"]
+        phi.hard     = ClauseStore.from_buffers(arrays["literals"], arrays["offsets"])
+        phi.soft     = dict(zip(arrays["soft"].tolist(), [int(w) if w.is_integer() else w for w in arrays["weights"].tolist()]))
+        phi.negative = set(arrays["negative"].tolist())
+        phi.varmap.key_to_value = arrays["key_to_value"]
+        phi.varmap.value_to_key = arrays["value_to_key"]
+        phi.origin   = {v: (i, k) for (v, i, k) in arrays["origin"].tolist()}
+        return phi
+
+    def write( self, file, external = False, batch = 1 << 16 ):
+        """
+        Writes the formula in the new DIMACS format (used since 2022) to the given text file object,
+        which may also be the input pipe of a subprocess.
+
+        With external = True, the clauses are written with the original variable names and weights
+        (@see __str__), otherwise the internal representation is written (@see __repr__).
+        The clauses are converted and written *batch* clauses at a time.
+        """
+        if external:
+            self._write_external(file, batch)
+            return
+        literals, offsets = self.hard.lits(), self.hard.bounds()
+        for start in range(0, len(self.hard), batch):
+            end    = min(start + batch, len(self.hard))
+            flat   = literals[offsets[start]:offsets[end]].tolist()
+            bounds = (offsets[start:end+1] - offsets[start]).tolist()
+            file.write("".join(f"h {' '.join(map(str,flat[a:b]))} 0\n" for (a,b) in zip(bounds, bounds[1:])))
+        items = list(self.soft.items())
+        for start in range(0, len(items), batch):
+            file.write("".join(f"{w} {v} 0\n" for (v,w) in items[start:start + batch]))
+
+    def _write_external(self, file, batch):
+        """
+        Writes the formula with the original variable names and weights (@see write).
+        Every soft clause is written once, at the position of the first hard clause encoding it.
+        """
+        owner = np.zeros(len(self.hard), dtype = np.int64)
+        for (v, (start, count)) in self.origin.items():
+            owner[start:start + count] = v
+        literals, offsets = self.hard.lits(), self.hard.bounds()
+        for start in range(0, len(self.hard), batch):
+            end    = min(start + batch, len(self.hard))
+            flat   = literals[offsets[start]:offsets[end]].astype(np.int64)
+            flat   = (np.sign(flat) * self.varmap.keys(np.abs(flat))).tolist()
+            bounds = (offsets[start:end+1] - offsets[start]).tolist()
+            lines  = []
+            for (i,v) in enumerate(owner[start:end].tolist()):
+                if v == 0:
+                    c, w = flat[bounds[i]:bounds[i+1]], "h"
+                elif self.origin[v][0] != start + i:
+                    continue
+                elif v in self.negative:
+                    c, w = self._to_external(self._soft_clause(v)), self._get_weight(v)
+                else:
+                    c, w = [l for l in flat[bounds[i]:bounds[i+1]] if l != 0], self._get_weight(v)
+                lines.append(f"{w} {' '.join(map(str,c))} 0\n")
+            file.write("".join(lines))
+        lines = []
+        for v in self.soft:
+            if self.origin.get(v, (0, 0))[1] == 0:
+                lines.append(f"{self._get_weight(v)} {' '.join(map(str,self._to_external(self._soft_clause(v))))} 0\n")
+        file.write("".join(lines))
+
     def __str__(self):
         """
         Prints the clause in the new DIMACS format (used since 2022).
         """
-        buffer = []
-        for c in self.hard:
-            w = self._get_weight(c)
-            if w == float("inf"):
-                w = "h"                
-            c = self._to_external(c)
-            buffer.append(f"{w} {' '.join(map(str,c))} 0")            
-        return "\n".join(buffer)
+        buffer = io.StringIO()
+        self.write(buffer, external = True)
+        return buffer.getvalue()[:-1]
 
     def __repr__(self):
         """
         Prints the internal representation of the formula in the new DIMACS format (used since 2022).
         """
-        buffer = []
-        for c in self.hard:
-            buffer.append(f"h {' '.join(map(str,c))} 0")
-        for v in self.soft:
-            buffer.append(f"{self.soft[v]} {v} 0")
-        return "\n".join(buffer)
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()[:-1]
@@ -1,4 +1,4 @@
-from torsomaxsat import WCNF
+from torsomaxsat import read_wcnf, Preprocessor
 from enum import Enum
 import tempfile, subprocess, os
 
@@ -16,37 +16,56 @@ class Solver():
         if self.preprocessor is None:                       
             self.solve()            
             return        
-        # Otherwise we preprocess, solve, and reconstruct.
+        # The native preprocessor runs in-process.
+        if self.preprocessor == "native":
+            self._native_preprocess()
+            if self.state == State.UNKNOWN:
+                self.solve()
+            if self.state == State.OPTIMAL:
+                self._native_reconstruct()
+            return
+        # Otherwise we preprocess with maxpre, solve, and reconstruct.
         self._maxpre_preprocess()
         self.solve()
         if self.state == State.OPTIMAL:
             self._maxpre_reconstruct()
 
+    def _native_preprocess(self):
+        self.old    = self.wcnf
+        self.native = Preprocessor(self.wcnf)
+        self.wcnf   = self.native.preprocess()
+        if self.wcnf is None:
+            self.wcnf  = self.old
+            self.state = State.UNSAT
+        elif self.wcnf.n == 0:
+            # Everything was decided by the preprocessor.
+            self.state      = State.OPTIMAL
+            self.fitness    = 0
+            self.assignment = []
+
+    def _native_reconstruct(self):
+        # The weight of soft variables fixed to true by the preprocessor is not part of the preprocessed formula.
+        self.assignment = self.native.reconstruct(self.assignment)
+        self.fitness    = self.fitness + self.native.gain
+        self.wcnf       = self.old
+
     def _maxpre_preprocess(self):
         # Generate a temporary file to store the formula.
         with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8') as wcnf_file, \
              tempfile.NamedTemporaryFile(delete=True, mode='r', encoding='utf-8') as map_file:
 
             # Write the formula to the first temporary file.
-            wcnf_file.write(repr(self.wcnf))
+            self.wcnf.write(wcnf_file)
             wcnf_file.flush()
             try:
                 # Run maxpre and store the map file to the second temporary file.
-                result = subprocess.run(self.preprocessor + " " + wcnf_file.name + " preprocess -techniques=[bu]#[buvsrg] -mapfile="+map_file.name+" -timelimit=120 -timelimit 120 -skiptechnique=100",
-                                        shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                process = subprocess.Popen(self.preprocessor + " " + wcnf_file.name + " preprocess -techniques=[bu]#[buvsrg] -mapfile="+map_file.name+" -timelimit=120 -timelimit 120 -skiptechnique=100",
+                                           shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
 
-                # Obtain the preprocessed wcnf.
-                output    = result.stdout
+                # Obtain the preprocessed wcnf (parsed directly from the pipe).
                 self.old  = self.wcnf
-                self.wcnf = WCNF()
-                for line in output.splitlines():                    
-                    line = line.strip().replace("  ", " ")                
-                    if line and not line.startswith(('c', 'p')):                        
-                        w, c = line.split(" ")[0], [int(x) for x in line.split(" ")[1:-1]]
-                        if w == "h":
-                            self.wcnf.add_clause( c );
-                        else:
-                            self.wcnf.add_clause( c, weight = float(w) );
+                self.wcnf = read_wcnf(process.stdout)
+                process.wait()
 
                 # Obtain the map file.
                 map_file.seek(0)
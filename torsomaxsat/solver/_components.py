@@ -0,0 +1,138 @@
+from torsomaxsat import Solver, State, PrimalGraph, WCNF, solver_from_string
+import numpy as np
+import multiprocessing
+import signal
+import queue
+import os
+
+def _sub_wcnf(split, i):
+    """
+    Builds the formula of the i-th group of components of the split formula (@see ComponentSolver._split), whose
+    variables are named by the internal variables of the input.
+    """
+    (literals, lengths, starts, clauses, soft, weights, bounds) = split
+    wcnf = WCNF()
+    (a, b) = (clauses[i], clauses[i+1])
+    wcnf.add_clauses(literals[starts[a]:starts[b]], lengths[a:b], np.full(b - a, float("inf")))
+    for (v,w) in zip(soft[bounds[i]:bounds[i+1]].tolist(), weights[bounds[i]:bounds[i+1]].tolist()):
+        wcnf._add_soft(v, w)
+    return wcnf
+
+def _stop(signum, frame):
+    # Take down the processes started by the subsolver (such as the ones of the dp solver) as well.
+    for child in multiprocessing.active_children():
+        child.terminate()
+    os._exit(1)
+
+def _solve_components(cmd, split, tasks, results, preprocessor, twsolver, subsolver, options):
+    signal.signal(signal.SIGTERM, _stop)
+    while True:
+        i = tasks.get()
+        if i is None:
+            return
+        wcnf   = _sub_wcnf(split, i)
+        solver = solver_from_string(cmd, wcnf, preprocessor = preprocessor, twsolver = twsolver, subsolver = subsolver, **options)
+        solver.solve()
+        names  = wcnf.varmap.keys(np.arange(1, wcnf.n + 1))
+        results.put((i, names, solver.assignment, solver.fitness, solver.state))
+
+class ComponentSolver(Solver):
+    """
+    Splits the formula into the connected components of its primal graph and solves them independently
+    with the solver *cmd* in *jobs* parallel worker processes (all cores by default). The fitness is the sum of the
+    fitness of the components and the assignment is the union of their assignments.
+
+    Small components are grouped until every group has at least *grain* literals, such that the overhead of
+    starting a solver is not paid for every tiny component. If a component is unsatisfiable, the other workers are stopped.
+    """
+
+    def __init__(self, wcnf, cmd, preprocessor = None, twsolver = None, subsolver = None, jobs = None, grain = 4096, options = None):
+        super().__init__(wcnf, preprocessor)
+        self.cmd       = cmd
+        self.twsolver  = twsolver
+        self.subsolver = subsolver
+        self.jobs      = jobs or os.cpu_count()
+        self.grain     = grain
+        self.options   = options or {}
+
+    def solve(self):
+        split  = self._split()
+        groups = len(split[3]) - 1
+        if groups <= 1:
+            # Nothing to split, solve the formula in this process.
+            solver = solver_from_string(self.cmd, self.wcnf, twsolver = self.twsolver, subsolver = self.subsolver, **self.options)
+            solver.solve()
+            (self.assignment, self.fitness, self.state) = (solver.assignment, solver.fitness, solver.state)
+            return
+        print(f"c Solving {groups} groups of components with {min(self.jobs, groups)} workers.", flush = True)
+
+        # Start the workers with the largest groups first (they get the split formula when they are started).
+        sizes   = np.diff(split[3])
+        tasks   = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+        for i in np.argsort(-sizes, kind = "stable").tolist():
+            tasks.put(i)
+        workers = [multiprocessing.Process(target=_solve_components, args=(self.cmd, split, tasks, results, None, self.twsolver, self.subsolver, self.options))
+                   for _ in range(min(self.jobs, groups))]
+        for _ in workers:
+            tasks.put(None)
+        for process in workers:
+            process.start()
+
+        # Collect and merge the results (as long as all groups are satisfiable).
+        model, self.fitness, self.state = np.zeros(self.wcnf.n, dtype = np.int64), 0, State.OPTIMAL
+        for _ in range(groups):
+            while True:
+                try:
+                    (i, names, assignment, fitness, state) = results.get(timeout = 0.1)
+                    break
+                except queue.Empty:
+                    if not any(process.is_alive() for process in workers):
+                        (i, state) = (None, State.ERROR) # A worker died without reporting its group.
+                        break
+            if state != State.OPTIMAL:
+                self.state = state
+                break
+            model[names - 1] = np.asarray(assignment[:len(names)]) > 0
+            self.fitness    += fitness
+        for process in workers:
+            process.terminate()
+            process.join()
+        self.assignment = model.tolist() if self.state == State.OPTIMAL else []
+
+    def _split(self):
+        """
+        Groups the clauses and the soft variables by the components of the primal graph. Returns flat arrays in which the
+        clauses (and soft variables) of each group are consecutive, together with the group boundaries in these arrays.
+        """
+        labels = PrimalGraph(self.wcnf, model = self.options.get("graph", "auto"), threshold = self.options.get("graph_threshold", 32)).components()
+        labels = np.concatenate((labels, np.arange(len(labels), self.wcnf.n + 1)))
+
+        # Every clause belongs to the component of its first variable, empty clauses to the one of the unused name 0.
+        literals = self.wcnf.hard.lits()
+        bounds   = self.wcnf.hard.bounds()
+        lengths  = np.diff(bounds)
+        clause   = np.zeros(len(lengths), dtype = np.int64)
+        clause[lengths > 0] = labels[np.abs(literals[bounds[:-1][lengths > 0]])]
+        soft     = np.fromiter(self.wcnf.soft.keys(),   dtype = np.int64,   count = len(self.wcnf.soft))
+        weights  = np.array(list(self.wcnf.soft.values()), dtype = object)
+
+        # Group the components (in the order of their labels) until each group has at least grain literals.
+        used     = np.unique(np.concatenate((clause, labels[soft])))
+        size     = np.zeros(len(labels), dtype = np.int64)
+        np.add.at(size, clause, lengths)
+        size     = np.maximum(size[used], 1)
+        group    = np.zeros(len(labels), dtype = np.int64)
+        group[used] = np.unique((np.cumsum(size) - size) // self.grain, return_inverse = True)[1]
+        (clause, soft_group) = (group[clause], group[labels[soft]])
+        groups   = int(group[used].max()) + 1 if len(used) > 0 else 0
+
+        # Sort the clauses and soft variables by their group.
+        order    = np.argsort(clause, kind = "stable")
+        lengths  = lengths[order]
+        starts   = np.concatenate(([0], np.cumsum(lengths)))
+        literals = literals[np.repeat(bounds[order] - starts[:-1], lengths) + np.arange(starts[-1])]
+        clauses  = np.searchsorted(clause[order], np.arange(groups + 1))
+        sorting  = np.argsort(soft_group, kind = "stable")
+        return (literals, lengths, starts, clauses, soft[sorting], weights[sorting],
+                np.searchsorted(soft_group[sorting], np.arange(groups + 1)))
@@ -1,60 +1,64 @@
 from torsomaxsat import Solver, solver_from_string
 from torsomaxsat import State
 from torsomaxsat import PrimalGraph
-from torsomaxsat import _utils
 from torsomaxsat import _wcnf
+from torsomaxsat.solver._tables import Table, Constraints, share, attach, unlink
 
+from multiprocessing import resource_tracker
+import multiprocessing
 import networkx as nx
-import functools
+import numpy as np
+import queue
 import copy
+import os
+import secrets
+
+def _available_memory():
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 1 << 30
+
+def _dp_worker(tasks, results, solver, tables, order):
+    # The solver, its prepared tables, and the order of the bags are passed by @see DPSolver.dp_parallel.
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        (i, children, result) = task
+        children = [(order[c], attach(name, rows, variables, unlink = True)) for (c, name, rows, variables) in children]
+        m = solver.node(tables, order[i], children)
+        results.put((i, share(m, result), len(m), m.variables))
 
 class DPSolver(Solver):
+    """
+    Solves the formula with a dynamic program over a torso decomposition (@see PrimalGraph.compute_torso_decomposition).
+    The tables of the bags are NumPy arrays (@see Table), the components outside of the torso are solved by the
+    subsolver for every assignment of their boundary.
+    """
 
     def __init__(self, wcnf, preprocessor, subsolver = "rc2"):
         super().__init__(wcnf, preprocessor)
-        #self.nogoods = []
-        #self.softngs = []
-        #self.costmap = {}
-
         self.subsolver = subsolver
-        self.nodes = None
-        self.varmap  = {}
-        #self.varmap_rev  = {}
-        self.poses = 0
-        #print(wcnf.hard)
-        #print(wcnf.soft)
-        # make bitmaps
-        #for c in self.wcnf.hard:
-        #    print("hard ", c)
-        #    self.nogoods.append(self.convert2nogood(c))
-
-        #for (c,w) in self.wcnf.soft.items():
-        #    print("soft ", (c,w))
-            # tuples of soft nogood + variable bitmask
-        #    n,m = self.convert2nogood([-c])
-        #    self.softngs.append((n,m,))
-        #    self.costmap[n] = w
-
-        #print("poses ", self.poses)
-        #print("nogoods ", self.nogoods)
-        #print("softngs ", self.softngs)
-        #print("costmap ", self.costmap)
-        #print("varmap ", self.varmap)
-
-    def conv2nogood(self,clause):
-        return self.makeMask([-l for l in clause]), self.makeMask(clause, zero_as_false=False)
-
-    def solve(self):         
+        self.options   = {}
+        self.nodes     = None
+
+    def solve(self):
         # compute a tree decomposition
-        g = PrimalGraph(self.wcnf, twsolver = self.twsolver)
+        g = PrimalGraph(self.wcnf, twsolver = self.twsolver, model = self.options.get("graph", "auto"), threshold = self.options.get("graph_threshold", 32),
+                        twtimeout = self.options.get("twtimeout"), cache = self.options.get("cache"))
         #width, self.td, self.root = g.compute_tree_decomposition(heuristic="fillin")
-        torso = g.compute_torso_decomposition()
+        torso = g.compute_torso_decomposition(heuristic = self.options.get("decomposition", "fillin"), budget = self.options.get("budget", 10),
+                                             fanin = self.options.get("fanin"), method = self.options.get("torso", "clingo"),
+                                             threads = self.options.get("torso_threads", 1), steps = self.options.get("torso_steps", 1),
+                                             k = self.options.get("torso_k", 60),
+                                             max_width = self.options.get("max_width", 20), on_torso = self.options.get("on_torso"))
         if torso is not None:
             width, self.td, self.root, self.nodes  = torso
         else:
             # We did not find a good torso, fall back to subsolver.
             print("c Unable to find a good torso.")
-            sub = solver_from_string(self.subsolver, self.wcnf, preprocessor = self.preprocessor, twsolver = self.twsolver, subsolver = self.subsolver)
+            sub = solver_from_string(self.subsolver, self.wcnf, preprocessor = self.preprocessor, twsolver = self.twsolver, subsolver = self.subsolver, **self.options)
             sub.solve()
             self.fitness    = sub.get_fitness()
             self.assignment = sub.assignment
@@ -63,466 +67,312 @@ class DPSolver(Solver):
 
         # execute the dp
         t=self.dp(self.prepare_dp())
+        if t is None:
+            self.state = State.ERROR
+            return
         # only at most 1 row at the root
         assert(len(t) <= 1)
         if len(t) > 0:
-            it = tuple(t.items())[0]
-            #self.fitness = functools.reduce(lambda a,w: a+w, self.costmap.values()) -it[1]
-            self.fitness = float(it[1]) #sum(self.wcnf.soft.values()) -it[1]
-            #self.fitness = -it[1]
+            self.fitness = float(t.values[0])
 
             #FIXME: enable tracking of assignment parts and output assignment
-            self.assignment = [0] * max(self.wcnf.varmap.value_to_key)
-            #self.assignment = [i for i in self.wcnf.varmap.value_to_key] #self.ass2lits(it[0])
-            #self.assignment = self.ass2lits(it[0])
-            #print(self.assignment)
+            self.assignment = [0] * self.wcnf.n
             self.state = State.OPTIMAL
-            #print("c OPTIMUM FOUND ", self.fitness)
         else:
-            #print("UNSAT")
             self.state = State.UNSAT
-            # Store the result in the internal format.
-            #self.fitness    = None 
-            #self.assignment = []
-
-    def inscope(self, clause, bag, par=None):
-        #print("SCOPE ", clause, bag)
-        for l in clause:
-            if abs(l) not in bag: #self.varmap:
-                return False
-
-        if par is not None:
-            for l in clause:
-                if abs(l) not in par:
-                    return True
-            return False
-            #else:
-            #    pos = self.varmap[abs(l)]
-            #    if pos not in self.varmap_rev or self.varmap_rev[pos] != abs(l):
-            #        return False
-        return True
-
-    def first(self, v, mask, start=0):
-        p = start
-        while start > 0:
-            mask = mask >> 1
-            start = start - 1
-        while (p < self.poses):
-            if mask & 1 == v:
-                #print("FIRST ", p, self.poses)
-                return p
-            p = p + 1
-            mask = mask >> 1
-        #print(" NO FIRST ", p, self.poses)
-        return self.poses
-
-    def maxpos(self, bag):
-        self.poses = 0
-        for i in bag:
-            self.poses = max(self.poses, self.varmap[i]+1)
-        #print("SET POS ", bag, self.pos)
-
-    def makeMask(self, nogood, update=None, zero_as_false=True):
-        m = 0
-        alloc = 0
-        firstfree = 0
-        if update is not None:
-            alloc = update[0]
-            self.maxpos(update[1])
-            #print("FREE ", alloc, self.poses)
-            #for pos in self.varmap_rev: # positions in-use
-            #    free = free | (1 << pos)
-        for b in nogood:
-            pos = None 
-            try:
-                pos = self.varmap[abs(b)]   # already assigned?
-                #print(abs(b), pos, self.varmap)
-                #print("ASS ", abs(b), pos)
-                if firstfree == pos:
-                    firstfree = firstfree + 1
-            except KeyError:
-                assert(update is not None)
-                pos = self.first(0,alloc,firstfree)
-                firstfree = pos + 1
-                assert(alloc & (1 << pos) == 0)
-            if update is not None:
-                alloc = alloc | (1 << pos)
-                self.varmap[abs(b)] = pos
-                #self.varmap_rev[pos] = abs(b)
-                self.poses = max(pos + 1, self.poses)
-            if b > 0 or not zero_as_false:
-                m = m | (1 << pos) #_utils._shift(pos)
-        return m
 
-    def mask2pos(self, mask):
-        pos = []
-        for i in range(0, self.poses):
-            if mask & 1 > 0:
-                pos.append(i)
-            mask = mask >> 1
-        return pos
-
-    def ass2lits(self, bag, ass):
-        #pos = self.mask2pos(ass)    #get positive list
-        lits = [] #pos and neg
-
-        for i in bag:
-            if ass & (1 << self.varmap[i]) > 0: # true / pos
-                lits.append(i)
-            else:   # false / neg
-                lits.append(-i)
-        return lits
-
-    def inv_nogood(self, nogood, k, mask):
-        n,m = nogood
-        # note that nogood needs to be visible (mind negative assignments)
-        # nogood visible and nogood invalidated
-        #return m & mask == m and k & m == n&m
-        return k & m == n
-
-    #clausel x v -y v z
-    #check whether 010 matches, i.e., whether we have nogood -x,y,-z
-    def good(self, ngs, k, mask):
-        for ng in ngs:                
-            if self.inv_nogood(ng, k, mask):  #nogood invalidated
-                #print("INV nogood ", ng, " for ", k)
-                return False
-        return True
-
-    def softgood(self, ngs, k, chmask, mask):
-        fitness = 0
-        for (n,m,w) in ngs:
-            #print("CHECKING SOFT ", n, m, k, chmask, mask)
-            if self.inv_nogood((n,m), k, chmask): #if we have clause -> expensive
-                #print("INV soft nogood ", (n,w), " for ", k)
-        # m & chmask == m and m & mask != m and k & n & m == n & m: 
-        # nogood visible in child, not anymore and unmatched --> cost + 1
-                fitness = fitness + w  
-        return fitness
+    def assign_clauses(self):
+        """
+        Assigns every hard clause to the lowest bag of the torso that contains all its variables or, if there is none,
+        to the subinstance (a bag outside of the torso) that contains it. The clauses are indexed by their variable that
+        occurs in the fewest bags, such that every bag only checks the clauses indexed by its own variables.
+        Returns two dicts that map the bags of the torso and the subinstances to their lists of clauses.
+        """
+        literals  = self.wcnf.hard.lits()
+        bounds    = self.wcnf.hard.bounds()
+        lengths   = np.diff(bounds)
+        order     = list(nx.dfs_postorder_nodes(self.td, self.root))   # children before their parent
+        torso     = [n for n in order if self.nodes is None or n in self.nodes]
+        subs      = [n for n in order if self.nodes is not None and n not in self.nodes]
+
+        # Index every clause by its variable that is contained in the fewest bags.
+        count     = np.zeros(self.wcnf.n + 1, dtype = np.int64)
+        for n in order:
+            count[list(n)] += 1
+        variables = np.abs(literals)
+        rank      = count[variables] * (self.wcnf.n + 1) + variables
+        anchor    = np.zeros(len(lengths), dtype = np.int64)
+        if len(rank) > 0:
+            anchor[lengths > 0] = np.minimum.reduceat(rank, bounds[:-1][lengths > 0]) % (self.wcnf.n + 1)
+        index     = np.argsort(anchor, kind = "stable")
+        starts    = np.searchsorted(anchor[index], np.arange(self.wcnf.n + 2))
+
+        # Take the first bag (in post-order) that contains a clause, starting with the bags of the torso.
+        assigned  = lengths == 0
+        clauses   = {n: [] for n in torso}
+        clauses[self.root] = [[] for _ in range(int(assigned.sum()))]   # empty clauses are falsified everywhere
+        subclauses = {}
+        for (bags, result) in ((torso, clauses), (subs, subclauses)):
+            for n in bags:
+                for v in n:
+                    for i in index[starts[v]:starts[v+1]].tolist():
+                        if assigned[i]:
+                            continue
+                        clause = literals[bounds[i]:bounds[i+1]].tolist()
+                        if all(abs(l) in n for l in clause):
+                            assigned[i] = True
+                            result.setdefault(n, []).append(clause)
+        return (clauses, subclauses)
 
     def prepare_dp(self):
         tables = {}
-      
+
         softs = copy.copy(self.wcnf.soft)
-       
-        #ngs = []
-        #for (clause,w) in self.wcnf.soft.items():
-        #    clause = [-clause]  #clause means we should have -clause
-        #    if self.inscope(clause, bag, par=par_bag):
-        #        (n,m) = self.conv2nogood(clause)
-        #        ngs.append((n,m,w,clause))
-       
-        # precompute non-interfering masks first
+        (clauses, subclauses) = self.assign_clauses()
+
         # assign bag formulas and subformulas
         for n in nx.dfs_preorder_nodes(self.td, self.root):
             # skip subproblem nodes
             if self.nodes is not None and n not in self.nodes:
                 continue
-            print("c PREPARE ", n, self.nodes, self.root)
             p = frozenset()
-            u = 0
             if n != self.root:
                 p = list(self.td.predecessors(n))[0]
-                u = tables[p][1]
-            
-            mask = self.makeMask(n, update=(u,p)) #bring parent mask 
-            
 
-            # soft constraints
+            # soft constraints (their weight is added when the variable is forgotten)
             soft = []
-            delc = []
             for k in n:
-                if k not in p:
-                    try:
-                        w = softs[k]
-                        nn,m = self.conv2nogood([-k])
-                        soft.append((nn,m,w,))
-                        delc.append(k)
-                    except KeyError:
-                        pass
-
-            for d in delc:  # never, ever do this soft constraint again! (in particular: not for any subinstance!)
-                #print(" DEL ", d)
-                del softs[d]
-
-            hard = []
-            
-            delc = []
-            pos = 0
+                if k not in p and k in softs:
+                    # never, ever do this soft constraint again! (in particular: not for any subinstance!)
+                    soft.append((k, softs.pop(k)))
+
+            # subinstances of the components attached to the bag
             sub = {}
-            
-            #FIXME: make faster somehow? --> better data structure like SDD?
-            for clause in self.wcnf.hard:
-                if self.inscope(clause, n):
-                    ng = self.conv2nogood(clause)
-                    #if n & mask == n:
-                    hard.append(ng) 
-                elif self.nodes is not None:
-                    for nn in self.td.successors(n):   #child nodes
-                        if nn not in self.nodes:    # only take the subproblem nodes
-                            if self.inscope(clause, nn):
-                                s = None
-                                try:
-                                    s = sub[nn]
-                                except KeyError:
-                                    s = _wcnf.WCNF()
-                                    sub[nn] = s
-
-                                s.add_clause(clause)
-                                for k in nn:
-                                    if k not in n:
-                                        w = None
-                                        try:
-                                            w=softs[k]
-                                        except KeyError:
-                                            pass
-                                        if w is not None:
-                                            s.add_clause([k], weight=float(w))
-                                            del softs[k]   # never do soft constraints twice!
-                                #print(" DEL ", pos)
-                                delc.append(pos)
-                                break   # a clause is only once in-scope!
-                pos = pos + 1
-          
-            #print(delhard, len(self.wcnf.hard))
-            pos = 0
-            for d in delc:
-                #print(d,pos,d-pos,len(self.wcnf.hard))
-                del self.wcnf.hard[d-pos]
-                pos = pos + 1
+            for nn in self.td.successors(n):   #child nodes
+                if nn in subclauses:
+                    s = _wcnf.WCNF()
+                    for clause in subclauses[nn]:
+                        s.add_clause(clause)
+                    for k in nn:
+                        if k not in n and k in softs:
+                            s.add_clause([k], weight=float(softs.pop(k)))   # never do soft constraints twice!
+                    sub[nn] = s
+
+            # compile the hard clauses for the variables that are not in the bags of the children
+            seen = set()
+            for nn in self.td.successors(n):
+                if self.nodes is None or nn in self.nodes:
+                    seen.update(nn)
+            hard = Constraints(clauses[n], [v for v in n if v not in seen])
 
             assert(n not in tables)
-            tables[n] = (None, mask, hard, soft, sub)
-            #print(tables)
-        #assert(False)
+            tables[n] = (None, hard, soft, sub)
         return tables
 
 
     def dp(self, tables):
+        """
+        Runs the dynamic program and returns the table of the root (or None if a worker failed). With the option
+        *jobs*, independent subtrees are processed in parallel (@see dp_parallel).
+        """
+        jobs = self.options.get("jobs") or 1
+        if jobs > 1 and len(tables) > 1:
+            return self.dp_parallel(tables, jobs)
         # dp
         for n in nx.dfs_postorder_nodes(self.td, self.root):
             if self.nodes is not None and n not in self.nodes:
-                #print("skip ", n)
                 continue
-            chmasks = 0
-            #cs = []
-            for c in self.td.successors(n):   #child nodes
-                #cs.append(c)
-                try:
-                    chmasks = chmasks | tables[c][1]
-                except KeyError:
-                    continue        # found subproblems
-
-            #print("chmasks ", chmasks)
-            
-            _,mask,hard,nsoft,sub = tables[n] #self.makeMask(n, update=0)   #update max poses
-            self.maxpos(n)
-            print("c NODE ", n, " MASK ", mask, " poses ", self.poses, " varmap ", self.varmap, hard, nsoft, "# sub maxsats: ", len(sub)) #, " sub ", sub)
-            m = None
-            if 'leaf' in self.td.nodes[n]: #n.isLeaf():
-                m = {0:0}   #empty assignment 0 : costs 0
-                #print('leaf')
-            else:
-                prevch = 0
-                mn,chmask,_,soft = (None, None, None, None)
-                #subbags = []
-                #for c in self.td.predecessors(n):   #child nodes
-                for c in self.td.successors(n):   #child nodes
-                    try:
-                        mn,chmask,_,soft,_ = tables[c]
-                    except KeyError:
-                        #subbags.append(c)
-                        continue
-                    #print("previous: ", c, tables[c][0])
-                    #chmask = tables[c][1] #self.td.bag(c))
-                    
-                    # grab table and soft (soft is 1 level behind)
-                    #soft = tables[c][3]
-                    # project
-                    #mn = self.forget(list(self.td.predecessors(n))[0], mn, mask, chmask)
-                    #mn = self.forget(c,n,soft, mn, mask, chmask)
-                    mn = self.forget(soft, mn, mask, chmask)
-                    #print("project ", mn, " mask ", mask, " chmask ", chmask)
-                    # join
-                    if m is None:
-                        m = mn
-                        prevch = chmask
-                    else:
-                        #print("joining ", mn, " with ", m)
-                        m = self.join(mask, mn, chmask, m, prevch)
-                        #print("join ", m)
-                        prevch = (chmask & mask) | (prevch & mask)    # could be union over both
-
-                    # free table
-                    del tables[c]
-                    # free allocated, removed mask elements
-                    #print(self.mask2pos(chmask & ~mask))
-                    #for i in self.mask2pos(chmask & ~mask):
-                        #assert(i in self.varmap_rev)
-                    #    del self.varmap_rev[i]
-           
-            # intr
-            print("c INTRO+SUB ", mask, " chmasks ", chmasks)
-            m = self.intro(n, hard, m, mask, chmasks, sub)
-            tables[n] = (m,mask,hard,nsoft,sub)
-            print("c SETTING ", m, " for ", n)
+            children = [(c, tables[c][0]) for c in self.td.successors(n) if c in tables]   # skip subproblems
+            m = self.node(tables, n, children)
+            # free tables
+            for (c,_) in children:
+                del tables[c]
+            tables[n] = (m,) + tables[n][1:]
         return tables[self.root][0]   #root table
 
+    def node(self, tables, n, children):
+        """
+        Computes the table of the bag n from the tables of its children in the torso (a list of pairs (child, table)).
+        """
+        _,hard,nsoft,sub = tables[n]
+        m = None
+        if children:
+            # project (the soft constraints of the child are added first) and join
+            m = self.join([self.forget(tables[c][2], mc, n) for (c, mc) in children])
+
+        # intr
+        m = self.intro(n, hard, m if m is not None else Table(), sub)
+        # one write per line, as the workers of the parallel dp share stdout
+        print(f"c NODE {sorted(n)} with {len(m)} rows, {len(hard)} clauses, {len(nsoft)} soft, {len(sub)} sub maxsats\n", end = "", flush = True)
+        return m
 
-    #equijoin of two dicts (only works if scheme is identical)
-    def join(self, mask, m1, m1mask, m2, m2mask):
-        m1mask = mask & m1mask
-        m2mask = mask & m2mask
-
-#        b = None
-#        if len(self.mask2pos(m1mask & ~m2mask)) < len(self.mask2pos(m2mask & ~m1mask)): #swap
-#            m = m1
-#            mm = m1mask
-#            
-#            m1 = m2
-#            m1 = m2mask
-#            
-#            m2 = m
-#            m2mask = mm
-#
-#        if ~m1mask & m2mask > 0:    #sth missing?
-#            b = self.mask2pos(m1mask | (~m1mask & m2mask))
-#            m1 = self.intro(b, m1, m1mask | (~m1mask & m2mask), m1mask)
-
-        m = {}
-
-        if False: #True: #m1mask == m2mask:    #equijoin
-            for (k,o) in m1.items():
+    def dp_parallel(self, tables, jobs):
+        """
+        Runs the dynamic program with *jobs* worker processes. A bag is computed as soon as the tables of all its
+        children are done, the tables are passed between the processes in shared memory (@see share). Bags are only
+        started while the estimated size of the tables in progress (16 bytes per row, at most *dp_memory* MB in total,
+        by default half of the available memory) permits it, but at least one bag is always in progress.
+        Bags with less than *dp_grain* estimated rows (default 4096) and without subinstances are computed by the
+        scheduler itself, such that the workers only get tasks that are worth the overhead.
+        """
+        order    = [n for n in nx.dfs_postorder_nodes(self.td, self.root) if n in tables]
+        index    = {n: i for (i,n) in enumerate(order)}
+        children = [[index[c] for c in self.td.successors(n) if c in index] for n in order]
+        parent   = [None] * len(order)
+        for (i, cs) in enumerate(children):
+            for c in cs:
+                parent[c] = i
+        waiting  = [len(cs) for cs in children]
+        budget   = self.options.get("dp_memory")
+        budget   = budget * (1 << 20) if budget is not None else _available_memory() // 2
+        grain    = self.options.get("dp_grain")
+        grain    = grain if grain is not None else 4096
+
+        # The workers get the prepared tables and the bags (copied once, when they are started).
+        resource_tracker.ensure_running()   # shared by the workers, such that they can unlink blocks of each other
+        tasks    = multiprocessing.Queue()
+        results  = multiprocessing.Queue()
+        workers  = [multiprocessing.Process(target=_dp_worker, args=(tasks, results, self, tables, order)) for _ in range(min(jobs, len(order)))]
+        for process in workers:
+            process.start()
+        print(f"c Running the dynamic program with {len(workers)} workers.", flush = True)
+
+        # The finished tables are either local tables or (name, rows, variables) of tables in shared memory.
+        done     = {}
+        ready    = [i for i in range(len(order)) if waiting[i] == 0]
+        running  = {}              # bag -> estimated size
+        blocks   = {}              # bag -> names of the blocks of its task (the tables of its children and its own)
+        prefix   = f"tms{os.getpid()}_{secrets.token_hex(3)}_"
+        local    = lambda t: t if isinstance(t, Table) else attach(*t, unlink = True)
+        shared   = lambda t: (share(t), len(t), t.variables) if isinstance(t, Table) else t
+        rows     = lambda t: len(t) if isinstance(t, Table) else t[1]
+        try:
+            while True:
+                # Start ready bags (in post-order) as long as the memory permits. The table of a bag has at most as many
+                # rows as the product of its children, times the assignments of its fresh variables.
+                ready.sort(reverse = True)
+                finished = []
+                while ready:
+                    i    = ready[-1]
+                    size = 2 ** len(tables[order[i]][1].fresh)
+                    for c in children[i]:
+                        size *= rows(done[c])
+                    size = 16 * min(2 ** len(order[i]), size)
+                    if size < 16 * grain and not tables[order[i]][3]:
+                        ready.pop()
+                        finished.append((i, self.node(tables, order[i], [(order[c], local(done.pop(c))) for c in children[i]])))
+                        break
+                    if len(running) >= len(workers) or (running and sum(running.values()) + size > budget):
+                        break
+                    ready.pop()
+                    running[i] = size
+                    task       = (i, [(c, *shared(done.pop(c))) for c in children[i]], prefix + str(i))
+                    blocks[i]  = [name for (_, name, _, _) in task[1]] + [task[2]]
+                    tasks.put(task)
+
+                # Otherwise wait for the next table of a worker.
+                if not finished:
+                    try:
+                        (i, name, n_rows, variables) = results.get(timeout = 0.1)
+                    except queue.Empty:
+                        if not all(process.is_alive() for process in workers):
+                            print("c A worker of the dynamic program died.")
+                            return None
+                        continue
+                    del running[i]
+                    del blocks[i]
+                    finished.append((i, (name, n_rows, variables)))
+
+                for (i, t) in finished:
+                    if parent[i] is None or rows(t) == 0:
+                        # The root is done (an empty table stays empty up to the root).
+                        t = local(t)
+                        return t if parent[i] is None else Table((), t.keys, t.values)
+                    done[i] = t
+                    waiting[parent[i]] -= 1
+                    if waiting[parent[i]] == 0:
+                        ready.append(parent[i])
+        finally:
+            for process in workers:
+                process.terminate()
+                process.join()
+            while True:
                 try:
-                    m[k] = o + m2[k]
-                except KeyError:
-                    pass
-        else:           # FIXME, only quadratic join ;/
-            for (k,o) in m1.items():
-                k = k & mask  #1,2   1,6   
-                for (k2,o2) in m2.items():
-                    k2 = k2 & mask
-                    if k & m2mask == k2 & m1mask:
-                        sofar = 0
-                        try:
-                            sofar = m[k|k2] #take sum of costs
-                        except KeyError:
-                            pass
-                        m[k|k2] = max(sofar, o + o2)
+                    unlink(results.get_nowait()[1])   # tables that were finished after the root (or an empty table)
+                except queue.Empty:
+                    break
+            for t in done.values():
+                if not isinstance(t, Table):
+                    unlink(t[0])
+            # Tasks that are still queued or were stopped while running (the blocks of their children and of their
+            # result, which the worker may have created already).
+            while True:
+                try:
+                    tasks.get_nowait()
+                except queue.Empty:
+                    break
+            for names in blocks.values():
+                for name in names:
+                    unlink(name)
+
+    def join(self, tables):
+        """
+        Joins the (projected) tables of the children (@see Table.join). The fold starts with the smallest table and
+        continues with the table for which the joined table is expected to be smallest, assuming that the assignments
+        of the common variables are spread evenly (|T1| * |T2| / 2^common rows).
+        """
+        tables = sorted(tables, key = len)
+        m      = tables.pop(0)
+        while tables and len(m) > 0:
+            def size(i):
+                common = sum(1 for v in tables[i].variables if v in m.variables)
+                return (len(m) * len(tables[i]) / 2.0 ** common, i)
+            m = m.join(tables.pop(min(range(len(tables)), key = size)))
+        if tables:
+            # An empty table stays empty, but the remaining variables belong to the result.
+            m = Table(m.variables + tuple(v for t in tables for v in t.variables if v not in m.variables),
+                      m.keys, m.values)
         return m
 
+    def intro(self, bag, hard, m1, sub):
+        """
+        Introduces the variables of the bag that are not in the joined table m1 and keeps the rows that satisfy the
+        hard clauses of the bag (compiled into @see Constraints), then adds the optimal fitness of the subinstances
+        attached to the bag.
+        """
+        m = hard.extend(m1)
 
-    #fresh items at poses
-    def intro(self, bag, hard, m1, mask, chmasks, sub):
-        #pos = set(bag).difference(ch_bag)
-        #print(pos)
-        pos = self.mask2pos(mask & ~chmasks)    #intro poses
-        #if len(pos) == 0:
-        #    return m1
-
-        #print("INTR POS ", pos)
-
-        # find sub bag-vars after projection
-        sub_vars = {}
+        # Solve every subinstance once per assignment of its variables in the bag (rows for which it is UNSAT are removed).
         for (ns,s) in sub.items():
-            submask = 0
-            for b in bag:
-                if b in s.varmap.key_to_value: #value_to_key:
-                    submask = submask | (1 << self.varmap[b])
-            sub_vars[ns] = submask
-
-        sub_cache = {}
-
-        #FIXME: avoid copying in some cases?
-        m = m1
-        if len(pos) > 0 or len(hard) > 0 or len(sub) > 0:
-            m = {}
-            for (k,o) in m1.items():
-                for ps in _utils.powerset(pos):
-                    kk = k 
-                    for p in ps:
-                        kk = kk | (1 << p)  #new candidate
-
-                    #print(kk)
-                    if self.good(hard, kk, mask):   #no nogood invalidated
-                        ow = 0
-                        for (ns,s) in sub.items():
-                            cache = None
-                            try:
-                                cache = sub_cache[ns]
-                            except KeyError:
-                                cache = {}
-                                sub_cache[ns] = cache
-
-                            submask = sub_vars[ns]
-                            wcnf = s
-                            kk_sub = kk & submask
-                            ass = self.ass2lits(bag, kk_sub)
-                            sub_res = None
-                            try:
-                                sub_res = cache[kk_sub]
-                                #print("CACHE HIT ", kk_sub, kk)
-                                if sub_res is None:
-                                    ow = None # no need to further call sth -> UNSAT
-                                    break
-                            except KeyError:
-                                pass
-                            if sub_res is not None: #cache hit
-                                ow = ow + sub_res
-                            else:  # not computed so far
-                                if len(ass) > 0: # something to assign?
-                                    wcnf = copy.deepcopy(s)
-                                    for l in ass:
-                                        if abs(l) in wcnf.varmap.key_to_value:  # only assign req. elements
-                                            wcnf.add_clause([l])
-                                #print("SOLVING SUBINSTANCE ", wcnf.varmap, wcnf.hard, " SOFT PART ", wcnf.soft, " FOR ", ns, " ON ", ass, kk_sub)
-                                subs = solver_from_string(self.subsolver, wcnf, preprocessor = self.preprocessor, twsolver = self.twsolver, subsolver = self.subsolver)
-                                subs.preprocess_and_solve()
-                                wcnf = None
-                                if subs.state != State.OPTIMAL:
-                                    #print("UNSAT")
-                                    subs.fitness = None
-                                    ow = None
-                                    break
-                                else:
-                                    #print("SOLVED SUBINSTANCE ", subs.fitness, " FOR ", ns, " ON ", ass, kk_sub)
-                                    #print("SOLVED SUBINSTANCE ", subs.fitness)
-                                    ow = ow + subs.fitness
-                                cache[kk_sub] = subs.fitness
-                        if ow is not None:
-                            #if ow > 0:
-                                #print("SUBINSTANCES ", ow, " to be added to ", o, " FOR ", kk, kk_sub)
-                            m[kk] = o + ow
+            boundary = [v for v in m.variables if v in s.varmap]
+            (codes, inverse) = np.unique(m.codes(boundary), return_inverse = True)
+            fitness  = np.array([self.subsolve(s, boundary, code) for code in codes.tolist()], dtype = np.float64)
+            values   = m.values + fitness[inverse.ravel()]
+            keep     = ~np.isnan(values)
+            m = Table(m.variables, m.keys[keep], values[keep])
         return m
 
-    #project according to bitmask
-    #def forget(self, bag, par_bag, soft, m1, mask, chmask):
-    def forget(self, soft, m1, mask, chmask):
-        keep = mask & chmask
-
-        #ngs = []
-        #for (clause,w) in self.wcnf.soft.items():
-        #    #print("candidate soft nogood ", clause)
-        #    clause = [-clause]  #clause means we should have -clause
-        #    if self.inscope(clause, bag, par=par_bag):
-        #        (n,m) = self.conv2nogood(clause)
-        #        #if n & mask != n: # and m & mask != m:
-        #        ngs.append((n,m,w))
-        #        #else:
-        #        #    print(clause, bag, n, chmask, m, mask)
-        #        #    assert(False)
-        #print(" SOFT vs ", soft, ngs)
-
-#        soft = ngs
-        #print("soft nogoods ", mask, chmask, soft)
-        m = {}
-        #print(m1)
-        for (k,o) in m1.items():
-            #print(k,o)
-            o = o + self.softgood(soft, k, chmask, mask)
-            k = k & keep
-            try:
-                m[k] = max(m[k], o) #take max fitness 
-            except KeyError:
-                m[k] = o
-        return m
+    def subsolve(self, s, boundary, code):
+        """
+        Solves the subinstance s under the assignment *code* of the variables *boundary* (bit j is the value of
+        boundary[j]) with the subsolver. Returns the fitness or NaN if the subinstance is UNSAT.
+        """
+        wcnf = s
+        if len(boundary) > 0: # something to assign?
+            wcnf = copy.deepcopy(s)
+            for (j,v) in enumerate(boundary):
+                wcnf.add_clause([v if (code >> j) & 1 else -v])
+        subs = solver_from_string(self.subsolver, wcnf, preprocessor = self.preprocessor, twsolver = self.twsolver, subsolver = self.subsolver, **self.options)
+        subs.preprocess_and_solve()
+        if subs.state != State.OPTIMAL:
+            return np.nan
+        return subs.fitness
+
+    def forget(self, soft, m1, bag):
+        """
+        Adds the weights of the soft constraints (pairs of a variable of the table and its weight) to the rows in which
+        they are satisfied and projects the table onto the variables of the bag (the parent), keeping the maximal fitness.
+        """
+        for (k,w) in soft:
+            m1 = m1.weight(k, w)
+        return m1.project([v for v in m1.variables if v in bag])
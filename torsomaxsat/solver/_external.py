@@ -1,58 +1,74 @@
 from torsomaxsat import Solver, State
+from torsomaxsat import _utils
 import tempfile, os, subprocess, sys
 from subprocess import TimeoutExpired
 
 class ExternalSolver(Solver):
 
-    def __init__(self, wcnf, solver_cmd, preprocessor = None, timeout = None):
+    def __init__(self, wcnf, solver_cmd, preprocessor = None, timeout = None, stdin = False):
         """
         An external solver may be given an additional timeout, which limits the time the sub process is run.
         This option is intended for the use of anytime solvers.
+
+        If stdin is set, the formula is streamed to the solver over its standard input instead of being
+        written to a temporary file (the solver command is then executed without a file argument).
         """
         super().__init__(wcnf, preprocessor)
         self.solver_cmd = solver_cmd
         self.timeout    = timeout
-    
+        self.stdin      = stdin
+
     def solve(self):
+        cmd = self.solver_cmd
+        if self.timeout is not None:
+            cmd = "timeout --preserve-status " + str(self.timeout) + " " + cmd
+
+        # Stream the formula to the solver without touching the disk.
+        if self.stdin:
+            process, writer = _utils.popen_with_input(cmd, self.wcnf.write, stderr=subprocess.DEVNULL)
+            output = process.stdout.read()
+            writer.join()
+            self._parse_output(output, process.wait())
+            return
 
         # Write the formula to a temporary file.
         with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8') as temp_file:
-            temp_file.write(repr(self.wcnf))
+            self.wcnf.write(temp_file)
             temp_file.flush()
             
         # Try to solve it with the sub solver.
         try:
-            if self.timeout is None:
-                result = subprocess.run(self.solver_cmd + " " + temp_file.name,
-                                          shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            else:
-                result = subprocess.run("timeout --preserve-status " + str(self.timeout) + " "
-                                        + self.solver_cmd + " " + temp_file.name,
-                                          shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output = result.stdout           
-            self.state = State.ERROR
-            if result.returncode == 0 or result.returncode == 10 or result.returncode == 40:
-                for line in output.splitlines():
-                    # Parse the statae of the sub solver.
-                    if line.startswith("s"):
-                        if line == "s OPTIMUM FOUND":
-                            self.state = State.OPTIMAL
-                        elif line == "s UNSATISFIABLE":
-                            self.state = State.UNSAT
-                            return
-
-                    # Parse the optimum value.
-                    if line.startswith("o"):
-                        self.fitness = self.wcnf._max_fitness() - float(line.split(" ")[1])
-                        if self.state != State.OPTIMAL:
-                            self.state = State.UNKNOWN
-
-                    # Parse the assignment.
-                    if line.startswith("v"):
-                        self.assignment = list(map(lambda x: int(x), line.split(" ")[1]))                
+            result = subprocess.run(cmd + " " + temp_file.name,
+                                    shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self._parse_output(result.stdout, result.returncode)
         except subprocess.CalledProcessError as e:
             print("c Error executing the sub solver:", e)
             sys.exit(1)
         finally:
             temp_file.close()
             os.remove(temp_file.name)
+
+    def _parse_output(self, output, returncode):
+        """
+        Reads state, optimum value, and assignment from the output of the external solver.
+        """
+        self.state = State.ERROR
+        if returncode == 0 or returncode == 10 or returncode == 40:
+            for line in output.splitlines():
+                # Parse the statae of the sub solver.
+                if line.startswith("s"):
+                    if line == "s OPTIMUM FOUND":
+                        self.state = State.OPTIMAL
+                    elif line == "s UNSATISFIABLE":
+                        self.state = State.UNSAT
+                        return
+
+                # Parse the optimum value.
+                if line.startswith("o"):
+                    self.fitness = self.wcnf._max_fitness() - float(line.split(" ")[1])
+                    if self.state != State.OPTIMAL:
+                        self.state = State.UNKNOWN
+
+                # Parse the assignment.
+                if line.startswith("v"):
+                    self.assignment = list(map(lambda x: int(x), line.split(" ")[1]))
@@ -11,7 +11,7 @@ class HSSolver(Solver):
         # Translate the torsomaxsat formula to a PySAT formula.
         phi = WCNF()
         for c in self.wcnf.hard:
-            phi.append(c)
+            phi.append(c.tolist())
         for v in self.wcnf.soft:
             phi.append([v], weight = self.wcnf.soft[v])
 
@@ -38,12 +38,7 @@ class HSSolver(Solver):
         if model:
             self.state      = State.OPTIMAL
             self.assignment = list(map(lambda l: 1 if l >= 0 else 0, model))            
-            self.fitness    = sum(
-                map(
-                    lambda v: self.wcnf.soft[v],
-                    filter( lambda v: self.assignment[v-1] == 1, self.wcnf.soft.keys() )
-                )
-            )            
+            self.fitness    = self.wcnf._fitness(self.assignment)
         else:
             self.state = State.UNSAT
 
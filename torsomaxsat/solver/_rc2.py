@@ -10,7 +10,7 @@ class RC2Solver(Solver):
         # Translate the torsomaxsat formula to a PySAT formula.
         phi = WCNF()
         for c in self.wcnf.hard:
-            phi.append(c)
+            phi.append(c.tolist())
         for v in self.wcnf.soft:
             phi.append([v], weight = self.wcnf.soft[v])
 
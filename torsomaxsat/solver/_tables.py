@@ -0,0 +1,228 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+def _gather(keys, positions):
+    """
+    Packs the bits of the keys at the given positions into new keys (bit j of the result is bit positions[j] of the key).
+    """
+    codes = np.zeros(len(keys), dtype = np.int64)
+    for (j, p) in enumerate(positions):
+        codes |= ((keys >> p) & 1) << j
+    return codes
+
+class Table:
+    """
+    A table of the dynamic program (@see DPSolver) over the variables of a bag. Every row is an assignment of the
+    variables together with the best fitness of the formula below the bag under this assignment. The assignments are
+    stored as integer keys in which bit i is the value of variables[i], the keys are sorted and unique.
+
+    All operations work on whole columns of NumPy arrays and return new tables. The default table has no variables
+    and the empty assignment with fitness 0 (the table of a leaf).
+    """
+    __slots__ = ("variables", "keys", "values")
+
+    def __init__(self, variables = (), keys = None, values = None):
+        self.variables = tuple(variables)
+        self.keys      = np.zeros(1, dtype = np.int64)   if keys   is None else keys
+        self.values    = np.zeros(1, dtype = np.float64) if values is None else values
+
+    def __len__(self):
+        return len(self.keys)
+
+    def positions(self, variables):
+        """
+        Returns the bit positions of the given variables in the keys.
+        """
+        index = {v: i for (i,v) in enumerate(self.variables)}
+        return [index[v] for v in variables]
+
+    def codes(self, variables):
+        """
+        Returns the assignments of the rows restricted to the given variables (bit j is the value of variables[j]).
+        """
+        return _gather(self.keys, self.positions(variables))
+
+    def weight(self, v, w):
+        """
+        Adds the weight w to the fitness of all rows in which the variable v is true.
+        """
+        p = self.positions([v])[0]
+        return Table(self.variables, self.keys, self.values + w * ((self.keys >> p) & 1))
+
+    def filter(self, clauses):
+        """
+        Removes the rows that falsify one of the clauses (lists of literals over the variables of the table).
+        """
+        index = {v: i for (i,v) in enumerate(self.variables)}
+        keep  = np.ones(len(self.keys), dtype = bool)
+        for clause in clauses:
+            # The clause is falsified if all positive literals are false and all negative ones true.
+            mask = nogood = 0
+            for l in clause:
+                mask   |= 1 << index[abs(l)]
+                nogood |= (l < 0) << index[abs(l)]
+            keep &= (self.keys & mask) != nogood
+        return Table(self.variables, self.keys[keep], self.values[keep])
+
+    def project(self, variables):
+        """
+        Forgets all variables except the given ones, keeping the maximal fitness of the rows that become equal.
+        """
+        variables = tuple(variables)
+        if variables == self.variables:
+            return self
+        codes = _gather(self.keys, self.positions(variables))
+        order = np.lexsort((self.values, codes))
+        codes = codes[order]
+        last  = np.ones(len(codes), dtype = bool)
+        last[:-1] = codes[1:] != codes[:-1]
+        return Table(variables, codes[last], self.values[order][last])
+
+    def introduce(self, variables):
+        """
+        Extends the table by the given variables (that are not yet part of it) with all their assignments.
+        """
+        new = [v for v in variables if v not in self.variables]
+        if not new:
+            return self
+        shift  = len(self.variables)
+        high   = np.arange(1 << len(new), dtype = np.int64) << shift
+        keys   = (high[:,None] | self.keys[None,:]).ravel()
+        values = np.tile(self.values, len(high))
+        return Table(self.variables + tuple(new), keys, values)
+
+    def join(self, other):
+        """
+        Joins the table with another one: rows that agree on the common variables are combined and their fitness added.
+        The rows of the smaller table (the build side) are sorted by their assignment of the common variables, such that
+        every row of the larger table is only combined with its group of matching rows (found by binary search).
+        """
+        shared = [v for v in self.variables if v in other.variables]
+        extra  = [v for v in other.variables if v not in self.variables]
+        (a, b) = (self.codes(shared), other.codes(shared))
+        swap   = len(self) < len(other)
+        (build, probe) = (a, b) if swap else (b, a)
+
+        # Find the group of every probe row in the sorted build side and enumerate the matching pairs.
+        order  = np.argsort(build, kind = "stable")
+        build  = build[order]
+        lo     = np.searchsorted(build, probe, side = "left")
+        counts = np.searchsorted(build, probe, side = "right") - lo
+        starts = np.cumsum(counts) - counts
+        p      = np.repeat(np.arange(len(probe)), counts)
+        q      = order[np.repeat(lo - starts, counts) + np.arange(len(p))]
+        (r, s) = (q, p) if swap else (p, q)
+
+        high   = _gather(other.keys, other.positions(extra)) << len(self.variables)
+        keys   = self.keys[r] | high[s]
+        values = self.values[r] + other.values[s]
+        order  = np.argsort(keys, kind = "stable")
+        return Table(self.variables + tuple(extra), keys[order], values[order])
+
+def _nogoods(clauses, variables):
+    """
+    Compiles clauses over the given variables (in key order) into arrays of masks and nogoods: a key falsifies the
+    clause if key & mask == nogood.
+    """
+    index  = {v: i for (i,v) in enumerate(variables)}
+    masks  = np.zeros(len(clauses), dtype = np.int64)
+    nogood = np.zeros(len(clauses), dtype = np.int64)
+    for (j, clause) in enumerate(clauses):
+        for l in clause:
+            masks[j]  |= 1 << index[abs(l)]
+            nogood[j] |= (l < 0) << index[abs(l)]
+    return (masks, nogood)
+
+class Constraints:
+    """
+    The hard clauses of a bag, compiled for introducing the variables *fresh* (those not in the tables of the children).
+    The fresh variables are introduced one after another, in an order in which clauses become fully assigned as early
+    as possible, and each clause is checked right after its last variable was introduced. The extensions are only
+    enumerated for the distinct assignments of the *context* (the other variables of clauses with fresh variables),
+    such that partial extensions that falsify a clause are never extended further.
+    """
+
+    def __init__(self, clauses, fresh):
+        fresh     = set(fresh)
+        rest      = [[abs(l) for l in clause if abs(l) in fresh] for clause in clauses]
+        remaining = [len(r) for r in rest]
+        occurs    = {v: [] for v in fresh}
+        for (j, r) in enumerate(rest):
+            for v in r:
+                occurs[v].append(j)
+
+        # Greedily take the fresh variable that completes the most clauses (or occurs in the most clauses).
+        self.fresh = []
+        steps      = [[clause for (clause, r) in zip(clauses, rest) if not r]]
+        while fresh:
+            v = max(sorted(fresh), key = lambda v: (sum(1 for j in occurs[v] if remaining[j] == 1), len(occurs[v])))
+            fresh.remove(v)
+            self.fresh.append(v)
+            steps.append([])
+            for j in occurs[v]:
+                remaining[j] -= 1
+                if remaining[j] == 0:
+                    steps[-1].append(clauses[j])
+        self.context = tuple(sorted({abs(l) for (clause, r) in zip(clauses, rest) if r for l in clause} - set(self.fresh)))
+        self.clauses = list(clauses)
+
+        # The first step filters the rows of the children, the others the extensions (whose variables are known).
+        self.first   = steps[0]
+        self.steps   = [_nogoods(steps[i+1], self.context + tuple(self.fresh[:i+1])) for i in range(len(self.fresh))]
+
+    def __len__(self):
+        return len(self.clauses)
+
+    def extend(self, table):
+        """
+        Introduces the fresh variables into the table and returns the rows that satisfy all clauses.
+        """
+        table = table.filter(self.first)
+        if not self.fresh or len(table) == 0:
+            return table.introduce(self.fresh)
+
+        # Enumerate the satisfying extensions of every assignment of the context that occurs in the table.
+        keys = np.unique(table.codes(self.context))
+        for (i, (masks, nogood)) in enumerate(self.steps):
+            bit  = np.int64(1) << (len(self.context) + i)
+            keys = np.concatenate((keys, keys | bit))
+            for (mask, ng) in zip(masks.tolist(), nogood.tolist()):
+                keys = keys[(keys & mask) != ng]
+        extensions = Table(self.context + tuple(self.fresh), keys, np.zeros(len(keys), dtype = np.float64))
+        return table.join(extensions)
+
+def share(table, name = None):
+    """
+    Copies the rows of the table into a new block of shared memory (with the given name or a random one) and returns
+    its name. The block stays alive until it is unlinked (@see attach), the variables of the table are not stored.
+    """
+    block = shared_memory.SharedMemory(name = name, create = True, size = max(1, 16 * len(table)))
+    np.ndarray(len(table), dtype = np.int64,   buffer = block.buf)[:] = table.keys
+    np.ndarray(len(table), dtype = np.float64, buffer = block.buf, offset = 8 * len(table))[:] = table.values
+    name = block.name
+    block.close()
+    return name
+
+def attach(name, rows, variables, unlink = False):
+    """
+    Returns a copy of the table with the given number of rows and variables stored in the block of shared memory *name*
+    (@see share). With unlink, the block is removed afterwards.
+    """
+    block  = shared_memory.SharedMemory(name = name)
+    keys   = np.ndarray(rows, dtype = np.int64,   buffer = block.buf).copy()
+    values = np.ndarray(rows, dtype = np.float64, buffer = block.buf, offset = 8 * rows).copy()
+    block.close()
+    if unlink:
+        block.unlink()
+    return Table(variables, keys, values)
+
+def unlink(name):
+    """
+    Removes a block of shared memory (@see share) that is no longer needed.
+    """
+    try:
+        block = shared_memory.SharedMemory(name = name)
+        block.close()
+        block.unlink()
+    except FileNotFoundError:
+        pass
@@ -3,16 +3,16 @@ import multiprocessing
 import copy
 import time
 
-def solve_sub(cmd, wcnf, subsolver, twsolver, preprocessor, result_queue):    
-    solver = solver_from_string(cmd, wcnf, preprocessor = preprocessor, twsolver = twsolver, subsolver = subsolver)
+def solve_sub(cmd, wcnf, subsolver, twsolver, preprocessor, options, result_queue):    
+    solver = solver_from_string(cmd, wcnf, preprocessor = preprocessor, twsolver = twsolver, subsolver = subsolver, **options)
     solver.solve()
     result_queue.put( (solver.assignment, solver.fitness, solver.state) )
                 
-def solve_vb(wcnf, subsolver, twsolver, preprocessor):
+def solve_vb(wcnf, subsolver, twsolver, preprocessor, options):
     # Run the solver and the solver in dp mode in parallel.
     result_queue = multiprocessing.Queue()
-    process_a    = multiprocessing.Process(target=solve_sub, args=("dpp", wcnf, subsolver, twsolver, preprocessor, result_queue))
-    process_b    = multiprocessing.Process(target=solve_sub, args=(subsolver, wcnf, subsolver, twsolver, preprocessor, result_queue))
+    process_a    = multiprocessing.Process(target=solve_sub, args=("dpp", wcnf, subsolver, twsolver, preprocessor, options, result_queue))
+    process_b    = multiprocessing.Process(target=solve_sub, args=(subsolver, wcnf, subsolver, twsolver, preprocessor, options, result_queue))
     
     # Start the solvers.
     process_a.start()
@@ -31,9 +31,10 @@ class VBSolver(Solver):
     def __init__(self, wcnf, preprocessor, subsolver = "rc2"):
         super().__init__(wcnf, preprocessor)
         self.subsolver = subsolver
+        self.options   = {}
 
     def solve(self):
-        result = solve_vb(self.wcnf, self.subsolver, self.twsolver, self.preprocessor)
+        result = solve_vb(self.wcnf, self.subsolver, self.twsolver, self.preprocessor, self.options)
         self.assignment = result[0]
         self.fitness    = result[1]
         self.state      = result[2]